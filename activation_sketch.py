@@ -0,0 +1,235 @@
+"""Quantile sketches of every neuron's full activation distribution.
+
+The metadata keeps only each neuron's top-k activations, so statistics
+computed from it describe a truncated tail. neuron_topk.py also feeds every
+activation into a `QuantileSketch` while it scans the raw matrices, and
+saves the result next to the metadata as `activation_sketches.npz`. From
+the sketch the app reads dataset-wide percentiles, the mean and a histogram
+of all images, not just the top ones.
+
+`QuantileSketch` is a KLL-style compactor sketch kept for all neurons at
+once. Items of weight w are buffered until there are 2 * capacity of them.
+They are then sorted and every other one is kept, at a random offset, with
+weight 2w. Every neuron sees the same number of rows, so all neurons share
+one compaction schedule and one weight per stored row, and every step is a
+vectorized operation over (rows, n_neurons) arrays. Past the first
+`capacity << EXACT_LEVELS` rows, incoming rows are sampled: one random row
+per stride, with the stride doubling as the row count doubles. Each
+neuron's quantiles are then within about 1% in rank of the exact ones, and
+the sketch stays a fixed size however many images there are. Sketches of
+disjoint row ranges merge, which is how the workers' results are combined.
+Counts, sums, minimum and maximum are tracked exactly.
+"""
+from dataclasses import replace
+
+import numpy as np
+
+from neuron_store import save_npz
+
+SKETCHES_FILENAME = "activation_sketches.npz"
+DEFAULT_CAPACITY = 256
+EXACT_LEVELS = 5
+
+
+class QuantileSketch:
+    """Mergeable weighted sample of one activation distribution per neuron (column)"""
+
+    def __init__(self, n_neurons, capacity=DEFAULT_CAPACITY, seed=0):
+        self.n_neurons = n_neurons
+        self.capacity = capacity
+        self.levels = {}  # weight -> (rows, n_neurons) float32, fewer than 2 * capacity rows
+        self.count = 0
+        self.finite = np.zeros(n_neurons, dtype=np.int64)
+        self.sum = np.zeros(n_neurons, dtype=np.float64)
+        self.min = np.full(n_neurons, np.inf)
+        self.max = np.full(n_neurons, -np.inf)
+        self._rng = np.random.default_rng(seed)
+
+    def stride(self, first_row):
+        """Sampling stride for rows from `first_row` on: 1 at first, then doubling with the row count"""
+        exact_rows = self.capacity << EXACT_LEVELS
+        return 1 << max((first_row // exact_rows).bit_length() - 1, 0)
+
+    def add(self, values, first_row=0):
+        """Add a block of rows that starts at global row `first_row`; NaN counts as -inf"""
+        values = np.asarray(values, dtype=np.float32)
+        self.count += len(values)
+        if not len(values):
+            return
+        finite = np.isfinite(values)
+        if finite.all():
+            self.finite += len(values)
+            self.sum += values.sum(axis=0, dtype=np.float64)
+            self.min = np.fmin(self.min, values.min(axis=0))
+            self.max = np.fmax(self.max, values.max(axis=0))
+        else:
+            self.finite += finite.sum(axis=0)
+            self.sum += np.where(finite, values, 0.0).sum(axis=0, dtype=np.float64)
+            self.min = np.fmin(self.min, np.where(finite, values, np.inf).min(axis=0))
+            self.max = np.fmax(self.max, np.where(finite, values, -np.inf).max(axis=0))
+            values = np.where(np.isnan(values), -np.inf, values)
+
+        stride = self.stride(first_row)
+        sampled = len(values) - len(values) % stride if stride > 1 else 0
+        if sampled:
+            groups = sampled // stride
+            pick = (np.arange(groups) * stride)[:, None] + self._rng.integers(0, stride, (groups, self.n_neurons))
+            self._insert(np.take_along_axis(values[:sampled], pick, axis=0), stride)
+        if sampled < len(values):
+            self._insert(values[sampled:], 1)
+
+    def _halve(self, items):
+        """Every other row of the column-sorted items, at a random offset per neuron"""
+        # Sorting contiguous rows of the transpose is about twice as fast as sorting down columns
+        ordered = np.sort(np.ascontiguousarray(items.T), axis=1)
+        offsets = self._rng.integers(0, 2, self.n_neurons)
+        return np.take_along_axis(ordered, offsets[:, None] + np.arange(0, len(items) - 1, 2), axis=1).T
+
+    def _insert(self, items, weight):
+        buffered = self.levels.pop(weight, None)
+        if buffered is not None:
+            items = np.concatenate([buffered, items])
+        full = len(items) - len(items) % (2 * self.capacity)
+        for start in range(0, full, 2 * self.capacity):
+            self._insert(self._halve(items[start:start + 2 * self.capacity]), 2 * weight)
+        if full < len(items):
+            self.levels[weight] = items[full:]
+
+    def merge(self, other):
+        """Fold in a sketch of other rows of the same neurons"""
+        for weight, items in other.levels.items():
+            self._insert(items, weight)
+        self.count += other.count
+        self.finite += other.finite
+        self.sum += other.sum
+        self.min = np.fmin(self.min, other.min)
+        self.max = np.fmax(self.max, other.max)
+        return self
+
+    def compress(self, max_rows=DEFAULT_CAPACITY):
+        """Halve the lightest levels until at most about `max_rows` rows are stored"""
+        while sum(len(items) for items in self.levels.values()) > max_rows:
+            halvable = [weight for weight, items in self.levels.items() if len(items) > 1]
+            if not halvable:
+                break
+            weight = min(halvable)
+            items = self.levels.pop(weight)
+            even = len(items) - len(items) % 2
+            if even < len(items):
+                self.levels[weight] = items[even:]
+            self._insert(self._halve(items[:even]), 2 * weight)
+        return self
+
+    def items(self):
+        """((rows, n_neurons) values, (rows,) weights) of everything stored"""
+        weights = sorted(self.levels)
+        if not weights:
+            return np.zeros((0, self.n_neurons), dtype=np.float32), np.zeros(0, dtype=np.int64)
+        return (np.concatenate([self.levels[w] for w in weights]),
+                np.concatenate([np.full(len(self.levels[w]), w, dtype=np.int64) for w in weights]))
+
+
+class ActivationSketches:
+    """Per-split activation sketches of every neuron, as saved by neuron_topk.py"""
+
+    def __init__(self, neuron_ids, splits):
+        self.neuron_ids = np.asarray(neuron_ids)
+        # split -> dict of values (rows, n), weights (rows,), count, finite, sum, min, max
+        self.splits = splits
+        self._columns = {int(nid): column for column, nid in enumerate(self.neuron_ids.tolist())}
+
+    @classmethod
+    def from_sketches(cls, neuron_ids, sketches):
+        splits = {}
+        for split, sketch in sketches.items():
+            values, weights = sketch.items()
+            splits[split] = {"values": values, "weights": weights, "count": np.array(sketch.count),
+                             "finite": sketch.finite, "sum": sketch.sum, "min": sketch.min, "max": sketch.max}
+        return cls(neuron_ids, splits)
+
+    def has(self, neuron_idx, split):
+        return split in self.splits and int(neuron_idx) in self._columns
+
+    def _column(self, neuron_idx, split):
+        """(sorted values, their weights) of one neuron"""
+        data = self.splits[split]
+        values = data["values"][:, self._columns[int(neuron_idx)]]
+        order = np.argsort(values, kind="stable")
+        return values[order].astype(np.float64), data["weights"][order]
+
+    def count(self, split):
+        """Images in the split"""
+        return int(self.splits[split]["count"])
+
+    def mean(self, neuron_idx, split):
+        data, column = self.splits[split], self._columns[int(neuron_idx)]
+        return float(data["sum"][column] / data["finite"][column]) if data["finite"][column] else float("nan")
+
+    def min(self, neuron_idx, split):
+        return float(self.splits[split]["min"][self._columns[int(neuron_idx)]])
+
+    def quantiles(self, neuron_idx, split, qs):
+        """Estimated quantiles qs (in [0, 1]) of the neuron's activations over every image in the split"""
+        values, weights = self._column(neuron_idx, split)
+        if not len(values):
+            return np.full(len(qs), np.nan)
+        # Each stored value stands for `weight` images centred on it
+        centres = np.cumsum(weights) - weights / 2
+        return np.interp(np.asarray(qs) * weights.sum(), centres, values)
+
+    def share_above(self, neuron_idx, split, value):
+        """Estimated share of the split's images on which the neuron exceeds value"""
+        values, weights = self._column(neuron_idx, split)
+        return float(weights[values > value].sum() / weights.sum()) if len(values) else float("nan")
+
+    def histogram(self, neuron_idx, split, bins=40):
+        """(counts scaled to images, bin edges) of the neuron's activations over every image in the split"""
+        values, weights = self._column(neuron_idx, split)
+        finite = np.isfinite(values)
+        counts, edges = np.histogram(values[finite], bins=bins, weights=weights[finite])
+        return counts * (self.count(split) / max(weights.sum(), 1)), edges
+
+    def save(self, path):
+        arrays = {"neuron_ids": self.neuron_ids, "splits": np.array(list(self.splits))}
+        for split, data in self.splits.items():
+            for key, array in data.items():
+                arrays[f"{split}|{key}"] = array
+        save_npz(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            splits = {}
+            for key in data.files:
+                if "|" in key:
+                    split, name = key.split("|")
+                    splits.setdefault(split, {})[name] = data[key]
+            return cls(data["neuron_ids"], {split: splits[split] for split in data["splits"].tolist()})
+
+
+def full_distribution_stats(stats, sketches):
+    """NeuronStats with its distribution fields taken over every image in the split; unchanged without a sketch
+
+    The max is the top image's either way. The selectivity ratio becomes max
+    over the mean of all images, and "strong" activations (above half the
+    max) are counted over all images.
+    """
+    if stats is None or sketches is None or not sketches.has(stats.neuron, stats.split):
+        return stats
+    neuron, split = stats.neuron, stats.split
+    count = sketches.count(split)
+    mean = sketches.mean(neuron, split)
+    low = sketches.min(neuron, split)
+    percentiles = sorted(stats.percentiles)
+    strong = sketches.share_above(neuron, split, stats.max * 0.5)
+    return replace(
+        stats,
+        count=count,
+        mean=mean,
+        min=low,
+        percentiles=dict(zip(percentiles, sketches.quantiles(neuron, split, np.array(percentiles) / 100).tolist())),
+        selectivity_ratio=stats.max / mean if mean > 0 else 0.0,
+        strong_count=int(round(strong * count)),
+        selectivity_percent=strong * 100,
+        dynamic_range=stats.max - low,
+    )
@@ -0,0 +1,362 @@
+"""Headless JSON API over the neuron metadata, for scripts and notebooks.
+
+Runs as its own process next to (or instead of) the Streamlit app and uses
+the same loaders: the same metadata store, and the same analysis indexes
+cached under CLIP_MICROSCOPE_CACHE_DIR, so an index built by either process
+is reused by the other.
+
+    python api.py [--host 127.0.0.1] [--port 8600] [--data DIR_OR_URL] [--store DIR]
+
+    GET /v1/summary                                  dataset summary and global distributions
+    GET /v1/neurons/<id>                             scalars, image counts, lucid image URL
+    GET /v1/neurons/<id>/stats?split=train           activation statistics
+    GET /v1/neurons/<id>/images?split=&offset=&limit= top images, paginated
+    GET /v1/neurons/<id>/classes?k=10                ImageNet class histogram
+    GET /v1/neurons/<id>/similar?k=20                most correlated neurons
+    GET /v1/neurons?ids=1,2,3&include=stats,classes  several neurons in one request
+
+Every response body is computed once, kept in a byte-bounded LRU cache
+together with its ETag and served from there afterwards, so cached reads
+are a dictionary lookup and a socket write. Clients that send
+If-None-Match get a 304. Connections are kept alive (HTTP/1.1).
+"""
+import argparse
+import hashlib
+import http.server
+import json
+import math
+import os
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from class_index import CLASS_INDEX_FILENAME, ClassHistogramIndex
+from dataset_layout import HF_BASE_URL, SUMMARY_PATH, lucid_image_path, neuron_image_path
+from global_stats import GLOBAL_STATS_FILENAME, GlobalStats, QUANTILES, metadata_splits
+from imagenet_classes import get_readable_class_name
+from metadata_cache import FetchError, MetadataCache, as_base_url
+from neuron_analysis import SIMILARITY_FILENAME, SimilarityIndex, compute_neuron_stats
+from neuron_data import load_or_build_index, metadata_version, open_metadata
+from neuron_shards import DEFAULT_MAX_SHARDS
+
+DEFAULT_PORT = 8600
+DEFAULT_CACHE_MB = 256
+MAX_PAGE = 500
+MAX_BULK = 500
+BULK_PARTS = ("neuron", "stats", "classes", "similar")
+CACHE_CONTROL = "public, max-age=3600"
+
+
+class ApiError(Exception):
+    """Raised by an endpoint to answer with an error status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ResponseCache:
+    """Thread-safe LRU of path -> (body bytes, ETag), bounded by total body size"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, body):
+        entry = (body, '"%s"' % hashlib.sha1(body).hexdigest()[:20])
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old[0])
+            self._entries[key] = entry
+            self.bytes += len(body)
+            while self.bytes > self.max_bytes and len(self._entries) > 1:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self.bytes -= len(evicted)
+        return entry
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _number(value):
+    """float for JSON, with NaN as null"""
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+def _int_param(query, name, default, low, high):
+    try:
+        value = int(query.get(name, [default])[0])
+    except ValueError:
+        raise ApiError(400, f"{name} must be an integer")
+    if not low <= value <= high:
+        raise ApiError(400, f"{name} must be between {low} and {high}")
+    return value
+
+
+class NeuronAPI:
+    """Routes API paths to JSON bodies, cached per path"""
+
+    def __init__(self, metadata, base_url, cache_dir, dataset_summary=None, cache_bytes=DEFAULT_CACHE_MB << 20):
+        self.metadata = metadata
+        self.version = metadata_version(metadata)
+        self.base_url = base_url
+        self.cache_dir = Path(cache_dir)
+        self.dataset_summary = dataset_summary or {}
+        self.splits = metadata_splits(metadata)
+        self.cache = ResponseCache(cache_bytes)
+        self._indexes = {}
+        self._index_lock = threading.Lock()
+
+    def _index(self, filename, index_cls):
+        """Analysis index, loaded or built on first use"""
+        index = self._indexes.get(filename)
+        if index is None:
+            with self._index_lock:
+                index = self._indexes.get(filename)
+                if index is None:
+                    index = load_or_build_index(self.metadata, self.version, filename, index_cls, self.cache_dir)
+                    self._indexes[filename] = index
+        return index
+
+    def respond(self, path):
+        """(body, ETag) for a request path; raises ApiError"""
+        entry = self.cache.get(path)
+        if entry is None:
+            url = urlsplit(path)
+            query = parse_qs(url.query)
+            parts = url.path.strip("/").split("/")
+            if parts[:2] == ["v1", "neurons"] and len(parts) == 2:
+                # Bulk bodies are spliced from the cached per-neuron bodies
+                return self.cache.put(path, self._bulk(query))
+            entry = self.cache.put(path, json.dumps(self._route(parts, query), separators=(",", ":")).encode())
+        return entry
+
+    def _route(self, parts, query):
+        if parts == ["v1", "summary"]:
+            return self.summary()
+        if len(parts) in (3, 4) and parts[:2] == ["v1", "neurons"]:
+            neuron_idx = self._neuron(parts[2])
+            resource = parts[3] if len(parts) == 4 else "neuron"
+            if resource == "neuron":
+                return self.neuron(neuron_idx)
+            if resource == "stats":
+                return self.stats(neuron_idx, self._split(query))
+            if resource == "images":
+                return self.images(neuron_idx, self._split(query), _int_param(query, "offset", 0, 0, sys.maxsize),
+                                   _int_param(query, "limit", 50, 1, MAX_PAGE))
+            if resource == "classes":
+                return self.classes(neuron_idx, _int_param(query, "k", 10, 1, 1000))
+            if resource == "similar":
+                index = self._index(SIMILARITY_FILENAME, SimilarityIndex)
+                return self.similar(neuron_idx, _int_param(query, "k", 20, 1, max(index.neighbors.shape[1], 1)))
+        raise ApiError(404, "no such endpoint")
+
+    def _neuron(self, value):
+        if not value.isdigit() or str(int(value)) not in self.metadata:
+            raise ApiError(404, f"no neuron {value}")
+        return int(value)
+
+    def _split(self, query):
+        split = query.get("split", ["train"])[0]
+        if split not in self.splits:
+            raise ApiError(400, f"split must be one of {', '.join(self.splits)}")
+        return split
+
+    def summary(self):
+        stats = self._index(GLOBAL_STATS_FILENAME, GlobalStats)
+        distributions = {}
+        for name, dist in stats.distributions.items():
+            distributions[name] = {
+                "count": len(dist),
+                "mean": _number(dist.mean),
+                "std": _number(dist.std),
+                "quantiles": {str(q): _number(v) for q, v in zip(QUANTILES, dist.quantiles)},
+                "histogram": {"edges": [_number(e) for e in dist.edges], "counts": dist.counts.tolist()},
+                "top": [{"id": nid, "value": v} for nid, v in dist.top(10)],
+                "bottom": [{"id": nid, "value": v} for nid, v in dist.bottom(10)],
+            }
+        return {
+            "version": self.version,
+            "neurons": len(self.metadata),
+            "splits": self.splits,
+            "dataset": self.dataset_summary,
+            "distributions": distributions,
+        }
+
+    def neuron(self, neuron_idx):
+        data = self.metadata[str(neuron_idx)]
+        top_images = data.get("top_images", {})
+        lucid = data.get("lucid_image")
+        return {
+            "id": neuron_idx,
+            "max_activation": _number(data.get("max_activation", math.nan)),
+            "mean_activation": _number(data.get("mean_activation", math.nan)),
+            "images": {split: len(top_images[split]) for split in top_images},
+            "lucid_url": f"{self.base_url}/{lucid_image_path(neuron_idx)}" if lucid else None,
+        }
+
+    def stats(self, neuron_idx, split):
+        stats = compute_neuron_stats(self.metadata, neuron_idx, split)
+        if stats is None:
+            raise ApiError(404, f"neuron {neuron_idx} has no {split} images")
+        return {
+            "id": neuron_idx,
+            "split": split,
+            "count": stats.count,
+            "max": _number(stats.max),
+            "min": _number(stats.min),
+            "mean": _number(stats.mean),
+            "percentiles": {str(q): _number(v) for q, v in stats.percentiles.items()},
+            "selectivity_ratio": _number(stats.selectivity_ratio),
+            "strong_count": stats.strong_count,
+            "selectivity_percent": _number(stats.selectivity_percent),
+            "dynamic_range": _number(stats.dynamic_range),
+        }
+
+    def images(self, neuron_idx, split, offset, limit):
+        images = self.metadata[str(neuron_idx)].get("top_images", {}).get(split, [])
+        page = []
+        for rank, img in enumerate(images[offset:offset + limit], start=offset):
+            page.append({
+                "rank": rank,
+                "activation": _number(img["activation"]),
+                "class": img["original_path"].split("/")[0] if "/" in img["original_path"] else None,
+                "url": f"{self.base_url}/{neuron_image_path(neuron_idx, img['filename'])}",
+            })
+        return {"id": neuron_idx, "split": split, "total": len(images), "offset": offset, "limit": limit,
+                "images": page}
+
+    def classes(self, neuron_idx, k):
+        index = self._index(CLASS_INDEX_FILENAME, ClassHistogramIndex)
+        return {
+            "id": neuron_idx,
+            "distinct": index.class_count(neuron_idx),
+            "classes": [{"wnid": wnid, "name": get_readable_class_name(wnid), "count": count}
+                        for wnid, count in index.top_classes(neuron_idx, k)],
+        }
+
+    def similar(self, neuron_idx, k):
+        index = self._index(SIMILARITY_FILENAME, SimilarityIndex)
+        return {"id": neuron_idx,
+                "similar": [{"id": nid, "similarity": _number(s)} for nid, s in index.most_similar(neuron_idx, k)]}
+
+    def _bulk(self, query):
+        ids = [value for values in query.get("ids", []) for value in values.split(",") if value]
+        if not ids:
+            raise ApiError(400, "ids is required")
+        if len(ids) > MAX_BULK:
+            raise ApiError(400, f"at most {MAX_BULK} ids per request")
+        include = [part for values in query.get("include", ["neuron"]) for part in values.split(",") if part]
+        unknown = [part for part in include if part not in BULK_PARTS]
+        if unknown:
+            raise ApiError(400, f"include must be among {', '.join(BULK_PARTS)}")
+        suffixes = {"neuron": "", "stats": f"/stats?split={self._split(query)}", "classes": "/classes",
+                    "similar": "/similar"}
+
+        chunks, missing = [], []
+        for value in ids:
+            try:
+                neuron_idx = self._neuron(value)
+            except ApiError:
+                missing.append(value)
+                continue
+            fields = []
+            for part in include:
+                try:
+                    body = self.respond(f"/v1/neurons/{neuron_idx}{suffixes[part]}")[0]
+                except ApiError:
+                    # e.g. no images in the requested split
+                    body = b"null"
+                fields.append(b'"%s":%s' % (part.encode(), body))
+            chunks.append(b'"%d":{%s}' % (neuron_idx, b",".join(fields)))
+        return b'{"neurons":{%s},"missing":%s}' % (b",".join(chunks), json.dumps(missing).encode())
+
+
+def make_handler(api):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out in separate writes; without this, delayed ACKs stall keep-alive clients
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            try:
+                body, etag = api.respond(self.path)
+            except ApiError as e:
+                self._send(e.status, json.dumps({"error": str(e)}).encode())
+                return
+            except Exception as e:
+                self.log_error("%s failed: %r", self.path, e)
+                self._send(500, b'{"error":"internal error"}')
+                return
+            if etag in self.headers.get("If-None-Match", ""):
+                self._send(304, b"", etag)
+            else:
+                self._send(200, body, etag)
+
+        def _send(self, status, body, etag=None):
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            if etag is not None:
+                self.send_header("Content-Type", "application/json")
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", CACHE_CONTROL)
+            elif body:
+                self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_request(self, code="-", size="-"):
+            pass
+
+    return Handler
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python api.py", description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--data", default=os.environ.get("CLIP_MICROSCOPE_DATA", HF_BASE_URL),
+                        help="dataset URL or local mirror (default: $CLIP_MICROSCOPE_DATA or Hugging Face)")
+    parser.add_argument("--store", default=os.environ.get("CLIP_MICROSCOPE_STORE"),
+                        help="prebuilt metadata store (default: $CLIP_MICROSCOPE_STORE)")
+    parser.add_argument("--cache-dir", type=Path, default=Path(os.environ.get(
+        "CLIP_MICROSCOPE_CACHE_DIR", Path.home() / ".cache" / "clip-microscope")))
+    parser.add_argument("--cache-mb", type=int, default=DEFAULT_CACHE_MB, help="response cache size")
+    args = parser.parse_args(argv[1:])
+
+    base_url = as_base_url(args.data)
+    fetch = MetadataCache(args.cache_dir / "http",
+                          ttl=int(os.environ.get("CLIP_MICROSCOPE_METADATA_TTL", 3600))).fetch
+    metadata = open_metadata(base_url, fetch, args.cache_dir, store_dir=args.store,
+                             max_shards=int(os.environ.get("CLIP_MICROSCOPE_SHARD_CACHE", DEFAULT_MAX_SHARDS)))
+    try:
+        dataset_summary = fetch(f"{base_url}/{SUMMARY_PATH}").json()
+    except FetchError:
+        dataset_summary = {}
+    api = NeuronAPI(metadata, base_url, args.cache_dir, dataset_summary, cache_bytes=args.cache_mb << 20)
+
+    server = http.server.ThreadingHTTPServer((args.host, args.port), make_handler(api))
+    server.daemon_threads = True
+    print(f"Serving {len(metadata)} neurons on http://{args.host}:{args.port}/v1/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
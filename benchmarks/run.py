@@ -0,0 +1,261 @@
+"""Benchmarks for the analysis functions and a full app rerun.
+
+Generates a synthetic dataset (see `synthetic.py`), points the app at it and
+times each case, reporting wall time (median and best of `--repeat` runs)
+plus the peak and retained Python allocations of one traced run:
+
+    python benchmarks/run.py                     # compare with baseline.json
+    python benchmarks/run.py --update-baseline   # record a new baseline
+    python benchmarks/run.py --cases similarity_network,app_rerun
+
+A case regresses when its median wall time or its peak memory exceeds the
+baseline by more than `--tolerance` (plus a small absolute slack, so
+sub-millisecond cases do not flap). Any regression makes the run exit 1.
+Baselines are only compared when they were recorded with the same dataset
+parameters.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(REPO_DIR))
+sys.path.insert(0, str(BENCH_DIR))
+
+import synthetic  # noqa: E402
+
+BASELINE_PATH = BENCH_DIR / "baseline.json"
+DEFAULT_REPEAT = 5
+DEFAULT_TOLERANCE = 0.3
+SLACK_MS = 2.0
+SLACK_KB = 256.0
+SELECTED_NEURON = 89
+TOPK_IMAGES = 32768
+
+
+def _setup_app(data_dir, store_dir, cache_dir):
+    """Point the app at the synthetic dataset and import it in bare mode"""
+    os.environ["CLIP_MICROSCOPE_STORE"] = str(store_dir)
+    os.environ["CLIP_MICROSCOPE_DATA"] = str(data_dir)
+    os.environ["CLIP_MICROSCOPE_CACHE_DIR"] = str(cache_dir)
+    os.environ["CLIP_MICROSCOPE_PREFETCH_WORKERS"] = "0"
+    import neuron_microscope_advanced as app
+    return app
+
+
+# Each case takes (app, metadata) and returns the callable to time
+def case_similarity_network(app, metadata):
+    index = app.SimilarityIndex.build(metadata)
+    return lambda: app.create_neuron_similarity_network(metadata, SELECTED_NEURON, similarity_index=index)
+
+
+def _page_indexes(app, metadata):
+    return dict(similarity_index=app.SimilarityIndex.build(metadata),
+                class_index=app.ClassHistogramIndex.build(metadata),
+                range_index=app.ActivationRangeIndex.build(metadata))
+
+
+def case_activation_distribution(app, metadata):
+    page = app.build_page(metadata, SELECTED_NEURON, "train", "", **_page_indexes(app, metadata))
+    return lambda: app.create_activation_distribution_plot(page)
+
+
+def case_build_page(app, metadata):
+    indexes = _page_indexes(app, metadata)
+    return lambda: app.build_page(metadata, SELECTED_NEURON, "train", app.DATA_BASE_URL, **indexes)
+
+
+def case_comparison_chart(app, metadata):
+    neighbours = [SELECTED_NEURON + offset for offset in range(-5, 5) if str(SELECTED_NEURON + offset) in metadata]
+    return lambda: app.create_neuron_comparison_chart(metadata, neighbours)
+
+
+def case_neuron_images(app, metadata):
+    return lambda: app.get_neuron_images_from_metadata(SELECTED_NEURON, metadata, max_images=200)
+
+
+def case_build_similarity_index(app, metadata):
+    return lambda: app.SimilarityIndex.build(metadata)
+
+
+def case_build_class_index(app, metadata):
+    return lambda: app.ClassHistogramIndex.build(metadata)
+
+
+def case_batch_neuron_stats(app, metadata):
+    from neuron_analysis import batch_neuron_stats
+    return lambda: batch_neuron_stats(metadata)
+
+
+def case_build_global_stats(app, metadata):
+    return lambda: app.GlobalStats.build(metadata)
+
+
+def case_build_topk(app, metadata):
+    import neuron_topk
+    tmp = tempfile.TemporaryDirectory(prefix="clip-bench-topk-")
+    split_dir = synthetic.write_activations(Path(tmp.name) / "train", TOPK_IMAGES, n_neurons=len(metadata))
+    # The closure keeps tmp, and so the chunks, alive while the case runs
+    return lambda: (tmp, neuron_topk.scan_split(split_dir, workers=0))[1]
+
+
+def case_app_rerun(app, metadata):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(str(REPO_DIR / "neuron_microscope_advanced.py"), default_timeout=300)
+    at.run()
+    if at.exception:
+        raise RuntimeError(f"App raised on first run: {at.exception[0].value}")
+    neurons = iter([SELECTED_NEURON, SELECTED_NEURON + 1] * 1000)
+
+    def rerun():
+        at.number_input[0].set_value(next(neurons))
+        at.run()
+        if at.exception:
+            raise RuntimeError(f"App raised on rerun: {at.exception[0].value}")
+    return rerun
+
+
+CASES = {
+    "similarity_network": case_similarity_network,
+    "activation_distribution": case_activation_distribution,
+    "build_page": case_build_page,
+    "comparison_chart": case_comparison_chart,
+    "neuron_images": case_neuron_images,
+    "build_similarity_index": case_build_similarity_index,
+    "build_class_index": case_build_class_index,
+    "batch_neuron_stats": case_batch_neuron_stats,
+    "build_global_stats": case_build_global_stats,
+    "build_topk": case_build_topk,
+    "app_rerun": case_app_rerun,
+}
+
+
+def measure(fn, repeat):
+    """{median_ms, min_ms, peak_kb, retained_kb} for fn; memory comes from one extra traced run"""
+    fn()  # warm-up: imports, lazy indexes, Streamlit caches
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        result = fn()
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return {
+        "median_ms": round(statistics.median(times), 3),
+        "min_ms": round(min(times), 3),
+        "peak_kb": round((peak - before) / 1024, 1),
+        "retained_kb": round((after - before) / 1024, 1),
+    }
+
+
+def regressions(results, baseline, tolerance):
+    """[(case, message), ...] for results worse than the baseline"""
+    found = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        limit_ms = base["median_ms"] * (1 + tolerance) + SLACK_MS
+        if result["median_ms"] > limit_ms:
+            found.append((name, f"median {result['median_ms']:.1f} ms > {limit_ms:.1f} ms "
+                                f"(baseline {base['median_ms']:.1f} ms)"))
+        limit_kb = base["peak_kb"] * (1 + tolerance) + SLACK_KB
+        if result["peak_kb"] > limit_kb:
+            found.append((name, f"peak {result['peak_kb']:.0f} KB > {limit_kb:.0f} KB "
+                                f"(baseline {base['peak_kb']:.0f} KB)"))
+    return found
+
+
+def _print_table(results, baseline):
+    print(f"{'case':<26}{'median ms':>11}{'min ms':>10}{'peak KB':>11}{'retained KB':>13}{'vs base':>9}")
+    for name, r in results.items():
+        base = baseline.get(name)
+        change = f"{(r['median_ms'] / base['median_ms'] - 1) * 100:+.0f}%" if base and base["median_ms"] else ""
+        print(f"{name:<26}{r['median_ms']:>11.2f}{r['min_ms']:>10.2f}{r['peak_kb']:>11.0f}"
+              f"{r['retained_kb']:>13.0f}{change:>9}")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python benchmarks/run.py", description=__doc__.splitlines()[0])
+    parser.add_argument("--neurons", type=int, default=synthetic.DEFAULT_NEURONS)
+    parser.add_argument("--top-k", type=int, default=synthetic.DEFAULT_TOP_K)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--cases", help="comma-separated subset of: " + ", ".join(CASES))
+    parser.add_argument("--no-app", action="store_true", help="skip the AppTest rerun case")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed relative slowdown before a case counts as a regression")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv[1:])
+
+    names = args.cases.split(",") if args.cases else list(CASES)
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        parser.error(f"unknown case(s): {', '.join(unknown)}")
+    if args.no_app and "app_rerun" in names:
+        names.remove("app_rerun")
+
+    params = {"neurons": args.neurons, "top_k": args.top_k, "seed": args.seed}
+    baseline = {}
+    if args.baseline.exists() and not args.update_baseline:
+        with open(args.baseline) as f:
+            recorded = json.load(f)
+        if recorded.get("params") == params:
+            baseline = recorded["cases"]
+        else:
+            print(f"Baseline was recorded with {recorded.get('params')}, not {params}; not comparing")
+
+    with tempfile.TemporaryDirectory(prefix="clip-bench-") as tmp:
+        start = time.perf_counter()
+        data_dir, store_dir = synthetic.write_dataset(
+            Path(tmp) / "data", n_neurons=args.neurons, top_k=args.top_k, seed=args.seed)
+        print(f"Generated {args.neurons} neurons x top-{args.top_k} in {time.perf_counter() - start:.1f}s")
+        app = _setup_app(data_dir, store_dir, Path(tmp) / "cache")
+        metadata = app.load_neuron_metadata()
+
+        results = {}
+        for name in names:
+            results[name] = measure(CASES[name](app, metadata), args.repeat)
+
+    _print_table(results, baseline)
+
+    if args.update_baseline:
+        if args.baseline.exists():
+            with open(args.baseline) as f:
+                recorded = json.load(f)
+            # Keep cases that were not run this time, if the dataset is the same
+            if recorded.get("params") == params:
+                results = {**recorded["cases"], **results}
+        with open(args.baseline, "w") as f:
+            json.dump({"params": params, "python": platform.python_version(), "cases": results}, f, indent=2)
+            f.write("\n")
+        print(f"Wrote {args.baseline}")
+        return 0
+
+    found = regressions(results, baseline, args.tolerance)
+    for name, message in found:
+        print(f"REGRESSION {name}: {message}")
+    return 1 if found else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
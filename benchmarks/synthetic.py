@@ -0,0 +1,136 @@
+"""Synthetic CLIP Microscope metadata for benchmarks.
+
+`generate_metadata()` returns a dict in the exact schema of
+`metadata/neuron_metadata.json`. Each neuron prefers a few ImageNet classes,
+drawn with a Zipf-like skew, so class histograms look like real neurons
+rather than uniform noise. `write_dataset()` lays out a data directory the
+app can run against (metadata JSON, dataset summary and a prebuilt store),
+without any images. `write_activations()` writes raw activation chunks for
+neuron_topk.py instead:
+
+    python benchmarks/synthetic.py /tmp/clip-bench --neurons 2560 --top-k 100
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from imagenet_classes import IMAGENET_CLASSES  # noqa: E402
+from neuron_store import build_store, source_version  # noqa: E402
+
+DEFAULT_NEURONS = 2560
+DEFAULT_TOP_K = 100
+DEFAULT_SPLITS = ("train", "val")
+
+
+def generate_metadata(n_neurons=DEFAULT_NEURONS, top_k=DEFAULT_TOP_K, splits=DEFAULT_SPLITS,
+                      n_classes=len(IMAGENET_CLASSES), concepts_per_neuron=3, selectivity=0.6,
+                      class_skew=1.1, lucid_fraction=0.9, seed=0):
+    """Neuron metadata dict keyed by str(neuron id)
+
+    Each top image belongs to one of the neuron's preferred classes with
+    probability `selectivity`, else to a class drawn from a Zipf(`class_skew`)
+    distribution over `n_classes`. Activations decay from a per-neuron
+    log-normal maximum, sorted high to low as in the real data.
+    """
+    rng = np.random.default_rng(seed)
+    classes = np.array(list(IMAGENET_CLASSES)[:n_classes])
+    popularity = 1.0 / np.arange(1, len(classes) + 1) ** class_skew
+    popularity /= popularity.sum()
+
+    metadata = {}
+    for neuron in range(n_neurons):
+        preferred = rng.choice(len(classes), size=concepts_per_neuron, replace=False, p=popularity)
+        peak = float(rng.lognormal(mean=1.2, sigma=0.4))
+        top_images = {}
+        for split in splits:
+            decay = np.sort(rng.exponential(0.35, size=top_k))
+            activations = np.sort(peak * np.exp(-decay) * rng.uniform(0.97, 1.0, size=top_k))[::-1]
+            from_preferred = rng.random(top_k) < selectivity
+            labels = np.where(
+                from_preferred,
+                preferred[rng.integers(0, concepts_per_neuron, size=top_k)],
+                rng.choice(len(classes), size=top_k, p=popularity),
+            )
+            image_ids = rng.integers(1, 20000, size=top_k)
+            top_images[split] = [
+                {
+                    "filename": f"{split}_rank_{rank:03d}.jpg",
+                    "activation": float(activation),
+                    "original_path": f"{classes[label]}/{classes[label]}_{image_id}.JPEG",
+                }
+                for rank, (activation, label, image_id) in enumerate(zip(activations, labels, image_ids))
+            ]
+        train = top_images[splits[0]]
+        data = {
+            "max_activation": train[0]["activation"],
+            "mean_activation": float(np.mean([img["activation"] for img in train])),
+        }
+        if rng.random() < lucid_fraction:
+            data["lucid_image"] = f"lucid/neuron_{neuron:04d}_lucid.png"
+        data["top_images"] = top_images
+        metadata[str(neuron)] = data
+    return metadata
+
+
+def write_activations(split_dir, n_images, n_neurons=DEFAULT_NEURONS, chunk_rows=8192,
+                      n_classes=len(IMAGENET_CLASSES), seed=0):
+    """Raw (n_images x n_neurons) float16 activations in neuron_topk.py's input layout"""
+    rng = np.random.default_rng(seed)
+    split_dir = Path(split_dir)
+    split_dir.mkdir(parents=True, exist_ok=True)
+    classes = np.array(list(IMAGENET_CLASSES)[:n_classes])
+    labels = rng.integers(0, len(classes), size=n_images)
+    with open(split_dir / "images.txt", "w") as f:
+        f.writelines(f"{classes[label]}/{classes[label]}_{row}.JPEG\n" for row, label in enumerate(labels))
+    for i, start in enumerate(range(0, n_images, chunk_rows)):
+        rows = min(chunk_rows, n_images - start)
+        np.save(split_dir / f"{i:03d}.npy", rng.standard_normal((rows, n_neurons), dtype=np.float32).astype(np.float16))
+    return split_dir
+
+
+def dataset_summary(metadata):
+    """dataset_summary.json matching the metadata"""
+    splits = {}
+    for data in metadata.values():
+        for split, images in data.get("top_images", {}).items():
+            splits.setdefault(split, {"total_images": 0})["total_images"] += len(images)
+    return {"dataset_info": {"total_neurons": len(metadata)}, "splits": splits}
+
+
+def write_dataset(out_dir, **params):
+    """Write metadata/, dataset summary and store/ under out_dir; returns (data_dir, store_dir)"""
+    out_dir = Path(out_dir)
+    metadata = generate_metadata(**params)
+    raw = json.dumps(metadata).encode("utf-8")
+    (out_dir / "metadata").mkdir(parents=True, exist_ok=True)
+    (out_dir / "metadata" / "neuron_metadata.json").write_bytes(raw)
+    with open(out_dir / "metadata" / "dataset_summary.json", "w") as f:
+        json.dump(dataset_summary(metadata), f)
+    store_dir = build_store(metadata, out_dir / "store", version=source_version(raw))
+    return out_dir, store_dir
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python benchmarks/synthetic.py", description=__doc__.splitlines()[0])
+    parser.add_argument("out_dir")
+    parser.add_argument("--neurons", type=int, default=DEFAULT_NEURONS)
+    parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K)
+    parser.add_argument("--splits", default=",".join(DEFAULT_SPLITS))
+    parser.add_argument("--classes", type=int, default=len(IMAGENET_CLASSES))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv[1:])
+    data_dir, store_dir = write_dataset(
+        args.out_dir, n_neurons=args.neurons, top_k=args.top_k,
+        splits=tuple(args.splits.split(",")), n_classes=args.classes, seed=args.seed,
+    )
+    print(f"Wrote {data_dir}/metadata and {store_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,309 @@
+"""ImageNet class indexes over the neurons' top images.
+
+`ClassHistogramIndex` counts, for every neuron, the ImageNet classes of its
+top images (the class is the `original_path` prefix, e.g.
+`n02099601/n02099601_3004.JPEG`). Counts are stored as a sparse matrix in
+both row (neuron) and column (class) order. "Top classes of neuron 355" is
+a row slice, and "neurons that fire most on n02099601" is a column slice.
+
+`ClassSearchIndex` is the inverted index behind the sidebar search. It maps
+each class, found by wnid or by readable name, to the neurons whose top
+images contain it, weighted by the summed activation of those images.
+"""
+import difflib
+
+import numpy as np
+
+from imagenet_classes import IMAGENET_CLASSES, get_readable_class_name
+from neuron_analysis import activation_matrix
+from neuron_store import NeuronStore, save_npz
+
+CLASS_INDEX_FILENAME = "classes.npz"
+CLASS_SEARCH_FILENAME = "class_search.npz"
+
+
+def class_of_path(path):
+    """ImageNet wnid an original_path belongs to, or None"""
+    if "/" in path:
+        return path.split("/")[0]
+    return None
+
+
+def class_labels(metadata, split="train", window=None):
+    """(classes, neuron_ids, (n, width) int32 class ids) for the top images
+
+    Class ids index `classes`, which starts with IMAGENET_CLASSES and is
+    extended with any other wnids found; -1 marks padding or paths
+    without a class.
+    """
+    classes = list(IMAGENET_CLASSES)
+    class_ids = {wnid: i for i, wnid in enumerate(classes)}
+
+    def class_id(path):
+        wnid = class_of_path(path)
+        if wnid is None:
+            return -1
+        if wnid not in class_ids:
+            class_ids[wnid] = len(classes)
+            classes.append(wnid)
+        return class_ids[wnid]
+
+    if isinstance(metadata, NeuronStore):
+        # Map every distinct path once, then gather through the interned indices
+        neuron_ids = np.asarray(metadata.neuron_ids)
+        if split in metadata.splits:
+            paths = metadata.path_table()
+            n_paths = len(paths)
+            lookup = np.array([class_id(path) for path in paths] + [-1], dtype=np.int32)
+            path_idx = np.asarray(metadata.path_indices(split)[:, :window])
+            # -1 padding indexes the trailing -1 entry of the lookup
+            labels = lookup[np.where(path_idx >= 0, path_idx, n_paths)]
+        else:
+            labels = np.full((len(neuron_ids), 0), -1, dtype=np.int32)
+    else:
+        neuron_ids = np.array([int(nid) for nid in metadata], dtype=np.int32)
+        all_images = [data.get("top_images", {}).get(split, [])[:window] for data in metadata.values()]
+        width = max((len(images) for images in all_images), default=0)
+        labels = np.full((len(neuron_ids), width), -1, dtype=np.int32)
+        for row, images in enumerate(all_images):
+            for i, img in enumerate(images):
+                labels[row, i] = class_id(img.get("original_path", ""))
+    return classes, neuron_ids, labels
+
+
+class ClassHistogramIndex:
+    """Sparse (neuron x class) count matrix of top-image ImageNet classes
+
+    Row entries are ordered by count, ties by first appearance in the
+    neuron's ranking, so row slices match collections.Counter.most_common()
+    over the same images. Column entries are ordered by count, then neuron.
+    """
+
+    def __init__(self, classes, neuron_ids, indptr, indices, counts, col_indptr, col_rows, col_counts):
+        self.classes = list(classes)
+        self.neuron_ids = neuron_ids
+        self.indptr = indptr
+        self.indices = indices
+        self.counts = counts
+        self.col_indptr = col_indptr
+        self.col_rows = col_rows
+        self.col_counts = col_counts
+        self.class_ids = {wnid: i for i, wnid in enumerate(self.classes)}
+        self._rows = {int(nid): row for row, nid in enumerate(neuron_ids.tolist())}
+
+    @classmethod
+    def build(cls, metadata, split="train", window=50):
+        """Count classes over the first `window` top images of each neuron"""
+        classes, neuron_ids, labels = class_labels(metadata, split, window)
+
+        n, width = len(neuron_ids), labels.shape[1]
+        rows = np.repeat(np.arange(n), width)
+        positions = np.tile(np.arange(width), n)
+        flat = labels.ravel()
+        keep = flat >= 0
+        rows, positions, flat = rows[keep], positions[keep], flat[keep]
+
+        # Dense accumulation is only (n x ~1000) and keeps this fully vectorized
+        dense_counts = np.zeros((n, len(classes)), dtype=np.int32)
+        np.add.at(dense_counts, (rows, flat), 1)
+        first_seen = np.full((n, len(classes)), width, dtype=np.int32)
+        np.minimum.at(first_seen, (rows, flat), positions)
+
+        nz_rows, nz_cols = np.nonzero(dense_counts)
+        nz_counts = dense_counts[nz_rows, nz_cols]
+        order = np.lexsort((first_seen[nz_rows, nz_cols], -nz_counts, nz_rows))
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(nz_rows, minlength=n), out=indptr[1:])
+
+        col_order = np.lexsort((nz_rows, -nz_counts, nz_cols))
+        col_indptr = np.zeros(len(classes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(nz_cols, minlength=len(classes)), out=col_indptr[1:])
+
+        count_dtype = np.int16 if width <= np.iinfo(np.int16).max else np.int32
+        return cls(
+            classes,
+            neuron_ids,
+            indptr,
+            nz_cols[order].astype(np.int16 if len(classes) <= np.iinfo(np.int16).max else np.int32),
+            nz_counts[order].astype(count_dtype),
+            col_indptr,
+            nz_rows[col_order].astype(np.int32),
+            nz_counts[col_order].astype(count_dtype),
+        )
+
+    def top_classes(self, neuron_idx, k=10):
+        """[(wnid, count), ...] for a neuron, most frequent first"""
+        row = self._rows.get(int(neuron_idx))
+        if row is None:
+            return []
+        start, end = self.indptr[row], min(self.indptr[row + 1], self.indptr[row] + k)
+        return [(self.classes[c], int(count)) for c, count in zip(self.indices[start:end], self.counts[start:end])]
+
+    def class_count(self, neuron_idx):
+        """Number of distinct classes among a neuron's indexed images"""
+        row = self._rows.get(int(neuron_idx))
+        if row is None:
+            return 0
+        return int(self.indptr[row + 1] - self.indptr[row])
+
+    def top_neurons(self, wnid, k=10):
+        """[(neuron_id, count), ...] of the neurons whose top images most often show wnid"""
+        c = self.class_ids.get(wnid)
+        if c is None:
+            return []
+        start, end = self.col_indptr[c], min(self.col_indptr[c + 1], self.col_indptr[c] + k)
+        rows = self.col_rows[start:end]
+        return list(zip(self.neuron_ids[rows].tolist(), self.col_counts[start:end].tolist()))
+
+    def save(self, path):
+        save_npz(
+            path,
+            classes=np.array(self.classes),
+            neuron_ids=self.neuron_ids,
+            indptr=self.indptr,
+            indices=self.indices,
+            counts=self.counts,
+            col_indptr=self.col_indptr,
+            col_rows=self.col_rows,
+            col_counts=self.col_counts,
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                data["classes"].tolist(),
+                data["neuron_ids"],
+                data["indptr"],
+                data["indices"],
+                data["counts"],
+                data["col_indptr"],
+                data["col_rows"],
+                data["col_counts"],
+            )
+
+
+def _normalize(text):
+    return text.strip().lower().replace("_", " ").replace("-", " ")
+
+
+class ClassSearchIndex:
+    """Inverted index from ImageNet class to neurons, weighted by activation"""
+
+    def __init__(self, classes, neuron_ids, col_indptr, col_rows, col_weights, col_counts):
+        self.classes = list(classes)
+        self.neuron_ids = neuron_ids
+        self.col_indptr = col_indptr
+        self.col_rows = col_rows
+        self.col_weights = col_weights
+        self.col_counts = col_counts
+        self.class_ids = {wnid: i for i, wnid in enumerate(self.classes)}
+        self.names = [_normalize(get_readable_class_name(wnid)) for wnid in self.classes]
+        self._words = [name.split() for name in self.names]
+
+    @classmethod
+    def build(cls, metadata, split="train"):
+        """Index every top image of every neuron in the split"""
+        classes, neuron_ids, labels = class_labels(metadata, split)
+        _, activations, _ = activation_matrix(metadata, split, width=labels.shape[1])
+
+        n, width = labels.shape
+        rows = np.repeat(np.arange(n), width)
+        flat = labels.ravel()
+        weights = activations[:, :width].astype(np.float64).ravel()
+        keep = flat >= 0
+        rows, flat, weights = rows[keep], flat[keep], np.nan_to_num(weights[keep])
+
+        # Sum activation and count images per (class, neuron) pair
+        pair = flat.astype(np.int64) * n + rows
+        pairs, inverse = np.unique(pair, return_inverse=True)
+        pair_weights = np.bincount(inverse, weights=weights)
+        pair_counts = np.bincount(inverse)
+        pair_cols, pair_rows = pairs // n, pairs % n
+
+        order = np.lexsort((pair_rows, -pair_weights, pair_cols))
+        col_indptr = np.zeros(len(classes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pair_cols, minlength=len(classes)), out=col_indptr[1:])
+        return cls(
+            classes,
+            neuron_ids,
+            col_indptr,
+            pair_rows[order].astype(np.int32),
+            pair_weights[order].astype(np.float32),
+            pair_counts[order].astype(np.int32),
+        )
+
+    def match_classes(self, query, limit=5):
+        """Class ids matching a wnid or (part of) a class name, best first
+
+        Exact matches come first, then names with a word starting with the
+        query, then substrings, then close spellings for typos.
+        """
+        query = _normalize(query)
+        if not query:
+            return []
+        exact_wnid = self.class_ids.get(query)
+        if exact_wnid is not None:
+            return [exact_wnid]
+
+        exact, prefix, substring = [], [], []
+        for c, (name, words) in enumerate(zip(self.names, self._words)):
+            if name == query:
+                exact.append(c)
+            elif name.startswith(query) or any(word.startswith(query) for word in words):
+                prefix.append(c)
+            elif query in name or query in self.classes[c]:
+                substring.append(c)
+        tiers = [exact, prefix, substring]
+        if not any(tiers):
+            # Several classes share a name (two "crane"s), so match names once and keep every class
+            close = difflib.get_close_matches(query, list(dict.fromkeys(self.names)), n=limit, cutoff=0.75)
+            tiers = [[c for name in close for c, other in enumerate(self.names) if other == name]]
+        # Within a tier, prefer classes that some neuron actually responds to
+        matches = []
+        for tier in tiers:
+            matches.extend(sorted(tier, key=lambda c: self.col_indptr[c + 1] == self.col_indptr[c]))
+        return matches[:limit]
+
+    def top_neurons(self, wnid, k=10):
+        """[(neuron_id, summed_activation, n_images), ...] for a class, strongest first"""
+        c = self.class_ids.get(wnid)
+        if c is None:
+            return []
+        start, end = self.col_indptr[c], min(self.col_indptr[c + 1], self.col_indptr[c] + k)
+        rows = self.col_rows[start:end]
+        return list(zip(
+            self.neuron_ids[rows].tolist(),
+            self.col_weights[start:end].astype(float).tolist(),
+            self.col_counts[start:end].tolist(),
+        ))
+
+    def search(self, query, limit=5, k=10):
+        """[(wnid, readable_name, top_neurons), ...] for the classes matching query"""
+        return [
+            (self.classes[c], get_readable_class_name(self.classes[c]), self.top_neurons(self.classes[c], k))
+            for c in self.match_classes(query, limit)
+        ]
+
+    def save(self, path):
+        save_npz(
+            path,
+            classes=np.array(self.classes),
+            neuron_ids=self.neuron_ids,
+            col_indptr=self.col_indptr,
+            col_rows=self.col_rows,
+            col_weights=self.col_weights,
+            col_counts=self.col_counts,
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                data["classes"].tolist(),
+                data["neuron_ids"],
+                data["col_indptr"],
+                data["col_rows"],
+                data["col_weights"],
+                data["col_counts"],
+            )
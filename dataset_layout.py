@@ -0,0 +1,19 @@
+"""Where the CLIP Microscope dataset keeps its files.
+
+Paths are relative to the dataset root: the Hugging Face repo, a local
+mirror made with mirror.py, or any other copy with the same layout.
+"""
+
+HF_REPO_ID = "ernestoBocini/clip-microscope-imagenet"
+HF_BASE_URL = f"https://huggingface.co/datasets/{HF_REPO_ID}/resolve/main"
+
+METADATA_PATH = "metadata/neuron_metadata.json"
+SUMMARY_PATH = "metadata/dataset_summary.json"
+
+
+def neuron_image_path(neuron_idx, filename):
+    return f"neurons/neuron_{neuron_idx:04d}/{filename}"
+
+
+def lucid_image_path(neuron_idx):
+    return f"lucid/neuron_{neuron_idx:04d}_lucid.png"
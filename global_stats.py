@@ -0,0 +1,200 @@
+"""Dataset-wide activation statistics for the Statistics tab.
+
+`GlobalStats` is built once per metadata version and shared by all
+sessions, so views read summaries instead of rescanning every neuron. It
+holds named `Distribution`s of one value per neuron:
+
+- `max_activation`, `mean_activation`: the neuron scalars
+- `<split>:max`, `<split>:mean`: max and mean of each neuron's top images
+  in that split
+
+Each one keeps fixed-bin histogram counts, quantiles, mean and std, plus
+the neurons sorted by value, so "most/least active" is a slice. Per split,
+it also keeps per-ImageNet-class sums over the top images labelled with
+that class, from which class means and std follow without a rescan.
+"""
+
+import numpy as np
+
+from class_index import class_labels
+from neuron_analysis import activation_matrix, scalar_column
+from neuron_shards import ShardedMetadata
+from neuron_store import NeuronStore, save_npz
+
+GLOBAL_STATS_FILENAME = "global_stats.npz"
+SCALAR_FIELDS = ("max_activation", "mean_activation")
+HIST_BINS = 50
+QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+_DIST_ARRAYS = ("neuron_ids", "values", "edges", "counts", "quantiles", "moments")
+
+
+def metadata_splits(metadata):
+    """Split names in the order the metadata lists them"""
+    if isinstance(metadata, (NeuronStore, ShardedMetadata)):
+        return list(metadata.splits)
+    splits = []
+    for data in metadata.values():
+        for split in data.get("top_images", {}):
+            if split not in splits:
+                splits.append(split)
+    return splits
+
+
+class Distribution:
+    """One value per neuron: histogram, quantiles, moments and neurons by value
+
+    `neuron_ids` and `values` are sorted by value, highest first (ties by
+    neuron order); neurons without a value are left out.
+    """
+
+    def __init__(self, neuron_ids, values, edges, counts, quantiles, moments):
+        self.neuron_ids = neuron_ids
+        self.values = values
+        self.edges = edges
+        self.counts = counts
+        self.quantiles = quantiles
+        self.mean, self.std = (float(m) for m in moments)
+
+    @classmethod
+    def build(cls, neuron_ids, values, bins=HIST_BINS):
+        keep = ~np.isnan(values)
+        neuron_ids, values = np.asarray(neuron_ids)[keep], values[keep]
+        order = np.argsort(-values, kind="stable")
+        if len(values):
+            counts, edges = np.histogram(values, bins=bins)
+            quantiles = np.quantile(values, QUANTILES)
+            moments = np.array([values.mean(), values.std()])
+        else:
+            counts, edges = np.zeros(bins, dtype=np.int64), np.linspace(0.0, 1.0, bins + 1)
+            quantiles = np.full(len(QUANTILES), np.nan)
+            moments = np.array([np.nan, np.nan])
+        return cls(neuron_ids[order], values[order], edges, counts, quantiles, moments)
+
+    def __len__(self):
+        return len(self.values)
+
+    def top(self, k=5):
+        """[(neuron_id, value), ...] for the k highest values"""
+        return list(zip(self.neuron_ids[:k].tolist(), self.values[:k].tolist()))
+
+    def bottom(self, k=5):
+        """[(neuron_id, value), ...] for the k lowest values, in descending order like top()"""
+        start = max(len(self) - k, 0)
+        return list(zip(self.neuron_ids[start:].tolist(), self.values[start:].tolist()))
+
+    def quantile(self, q):
+        """Quantile q, from the stored ones if q is one of QUANTILES"""
+        if q in QUANTILES:
+            return float(self.quantiles[QUANTILES.index(q)])
+        return float(np.quantile(self.values, q)) if len(self) else float("nan")
+
+    def percentile_of(self, value):
+        """Share of neurons, in percent, whose value is below `value`"""
+        if not len(self):
+            return float("nan")
+        below = len(self) - np.searchsorted(-self.values, -value, side="left")
+        return 100.0 * below / len(self)
+
+    def arrays(self):
+        return dict(zip(_DIST_ARRAYS, (self.neuron_ids, self.values, self.edges, self.counts, self.quantiles,
+                                       np.array([self.mean, self.std]))))
+
+
+class GlobalStats:
+    """Named per-neuron Distributions plus per-split, per-class activation sums"""
+
+    def __init__(self, distributions, classes, class_sums):
+        self.distributions = distributions
+        self.classes = list(classes)
+        # split -> (n_classes, 4) float64: count, sum, sum of squares, max
+        self.class_sums = class_sums
+        self.class_ids = {wnid: i for i, wnid in enumerate(self.classes)}
+
+    @classmethod
+    def build(cls, metadata, bins=HIST_BINS):
+        distributions = {}
+        for field in SCALAR_FIELDS:
+            neuron_ids, values = scalar_column(metadata, field, default=np.nan)
+            distributions[field] = Distribution.build(neuron_ids, values, bins)
+
+        classes, class_ids, class_sums = [], {}, {}
+        for split in metadata_splits(metadata):
+            neuron_ids, activations, counts = activation_matrix(metadata, split)
+            x = activations.astype(np.float64)
+            missing = counts <= 0
+            per_neuron = {"max": np.full(len(x), np.nan), "mean": np.full(len(x), np.nan)}
+            if x.shape[1]:
+                # Rows without data would warn in the nan-reductions; give them a dummy value
+                padded = x.copy()
+                padded[missing, 0] = 0.0
+                per_neuron = {"max": np.nanmax(padded, axis=1), "mean": np.nanmean(padded, axis=1)}
+            for name, values in per_neuron.items():
+                values[missing] = np.nan
+                distributions[f"{split}:{name}"] = Distribution.build(neuron_ids, values, bins)
+
+            split_classes, _, labels = class_labels(metadata, split)
+            # Class ids past IMAGENET_CLASSES depend on the split; map them onto one list
+            for wnid in split_classes:
+                if wnid not in class_ids:
+                    class_ids[wnid] = len(classes)
+                    classes.append(wnid)
+            to_global = np.array([class_ids[wnid] for wnid in split_classes], dtype=np.int64)
+            width = min(labels.shape[1], x.shape[1])
+            labels, x = labels[:, :width].ravel(), x[:, :width].ravel()
+            keep = (labels >= 0) & ~np.isnan(x)
+            labels, x = to_global[labels[keep]], x[keep]
+            sums = np.zeros((len(classes), 4))
+            sums[:, 0] = np.bincount(labels, minlength=len(classes))
+            sums[:, 1] = np.bincount(labels, weights=x, minlength=len(classes))
+            sums[:, 2] = np.bincount(labels, weights=x * x, minlength=len(classes))
+            sums[:, 3] = np.nan
+            np.fmax.at(sums[:, 3], labels, x)
+            class_sums[split] = sums
+        # Classes first seen in a later split have no rows in earlier splits' sums yet
+        for split, sums in class_sums.items():
+            if len(sums) < len(classes):
+                pad = np.zeros((len(classes) - len(sums), 4))
+                pad[:, 3] = np.nan
+                class_sums[split] = np.vstack([sums, pad])
+        return cls(distributions, classes, class_sums)
+
+    def __getitem__(self, name):
+        return self.distributions[name]
+
+    def __contains__(self, name):
+        return name in self.distributions
+
+    @property
+    def splits(self):
+        return list(self.class_sums)
+
+    def class_summary(self, wnid, split="train"):
+        """(n_images, mean, std, max) of the top-image activations labelled wnid, or None"""
+        i = self.class_ids.get(wnid)
+        sums = self.class_sums.get(split)
+        if i is None or sums is None or sums[i, 0] == 0:
+            return None
+        n, total, squares, peak = sums[i]
+        mean = total / n
+        return int(n), float(mean), float(np.sqrt(max(squares / n - mean * mean, 0.0))), float(peak)
+
+    def save(self, path):
+        arrays = {"classes": np.array(self.classes), "splits": np.array(self.splits)}
+        for name, dist in self.distributions.items():
+            for key, array in dist.arrays().items():
+                arrays[f"dist|{name}|{key}"] = array
+        for split, sums in self.class_sums.items():
+            arrays[f"class_sums|{split}"] = sums
+        save_npz(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            fields = {}
+            for key in data.files:
+                if key.startswith("dist|"):
+                    _, name, array = key.split("|")
+                    fields.setdefault(name, {})[array] = data[key]
+            distributions = {name: Distribution(**arrays) for name, arrays in fields.items()}
+            class_sums = {split: data[f"class_sums|{split}"] for split in data["splits"].tolist()}
+            return cls(distributions, data["classes"].tolist(), class_sums)
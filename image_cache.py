@@ -0,0 +1,316 @@
+"""Server-side image cache with fixed-size thumbnails.
+
+Remote images are fetched once through a pooled `requests.Session` and
+kept on local disk: a WebP (or JPEG) thumbnail for grids, and the original
+only when someone asks for full resolution. The cache stays under a byte
+budget by evicting the least recently used files, so popular neurons are
+served from local disk. Originals under `file://` URLs (a local mirror)
+are used in place; only their thumbnails are cached.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+import requests
+from PIL import Image, ImageDraw, ImageFont, features
+from requests.adapters import HTTPAdapter
+
+from instrumentation import TRACER
+from metadata_cache import local_path
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+DEFAULT_THUMBNAIL_SIZE = (256, 256)
+DEFAULT_TIMEOUT = (5, 30)
+FAILURE_RETRY_SECONDS = 300
+POOL_SIZE = 16
+CONTACT_SHEET_CELL = (160, 160)
+CONTACT_SHEET_CAPTION = 18
+
+
+def render_contact_sheet(images, captions, columns=5, cell_size=CONTACT_SHEET_CELL):
+    """Tile images into one JPEG, returning (bytes, size, [(x0, y0, x1, y1), ...])
+
+    Each image is fitted into its cell with its caption underneath. Missing
+    images (None) leave an empty cell so positions still line up with ranks.
+    """
+    cell_w, cell_h = cell_size
+    row_h = cell_h + CONTACT_SHEET_CAPTION
+    rows = (len(images) + columns - 1) // columns
+    sheet = Image.new("RGB", (columns * cell_w, max(rows, 1) * row_h), "white")
+    draw = ImageDraw.Draw(sheet)
+    font = ImageFont.load_default()
+
+    boxes = []
+    for i, (img, caption) in enumerate(zip(images, captions)):
+        x0 = (i % columns) * cell_w
+        y0 = (i // columns) * row_h
+        if img is not None:
+            if not isinstance(img, Image.Image):
+                img = Image.open(img)
+            img = img.convert("RGB")
+            img.thumbnail((cell_w - 4, cell_h - 4))
+            sheet.paste(img, (x0 + (cell_w - img.width) // 2, y0 + (cell_h - img.height) // 2))
+        else:
+            draw.rectangle((x0 + 2, y0 + 2, x0 + cell_w - 3, y0 + cell_h - 3), outline="#e2e8f0")
+        draw.text((x0 + 4, y0 + cell_h + 2), caption, fill="#1e293b", font=font)
+        boxes.append((x0, y0, x0 + cell_w, y0 + row_h))
+
+    out = BytesIO()
+    sheet.save(out, format="JPEG", quality=85)
+    return out.getvalue(), sheet.size, boxes
+
+
+def make_session(pool_size=POOL_SIZE):
+    """requests.Session whose connection pool matches our fetch concurrency"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=2)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class ImageCache:
+    """Disk-backed LRU of original images and their thumbnails"""
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES, thumbnail_size=DEFAULT_THUMBNAIL_SIZE,
+                 quality=80, timeout=DEFAULT_TIMEOUT, session=None):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.thumbnail_size = tuple(thumbnail_size)
+        self.quality = quality
+        self.timeout = timeout
+        self.session = session or make_session()
+        self.format, self.suffix = ("WEBP", "webp") if features.check("webp") else ("JPEG", "jpg")
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        # url -> (time, status) of recent failed fetches, oldest first
+        self._failures = OrderedDict()
+        self._load_index()
+
+    def _load_index(self):
+        """Rebuild the LRU order from what is already on disk, oldest first"""
+        files = []
+        for path in self.cache_dir.iterdir():
+            if path.name.startswith("."):
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, path.name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._total_bytes += size
+        self._evict()
+
+    def _key(self, url):
+        return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+    def _hit(self, name):
+        path = self.cache_dir / name
+        with self._lock:
+            known = name in self._entries
+            if known:
+                self._entries.move_to_end(name)
+        if not known:
+            # Written by another process sharing the directory, e.g. warmup.py
+            try:
+                size = path.stat().st_size
+            except OSError:
+                return None
+            with self._lock:
+                if name not in self._entries:
+                    self._entries[name] = size
+                    self._total_bytes += size
+                    self._evict()
+            return path
+        if not path.exists():
+            # Evicted by another process sharing the directory
+            with self._lock:
+                self._total_bytes -= self._entries.pop(name, 0)
+            return None
+        return path
+
+    def _store(self, name, data):
+        path = self.cache_dir / name
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        with self._lock:
+            self._total_bytes += len(data) - self._entries.pop(name, 0)
+            self._entries[name] = len(data)
+            self._evict()
+        return path
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            name, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                (self.cache_dir / name).unlink()
+            except OSError:
+                pass
+
+    def _download(self, url):
+        # Don't hammer the origin for images that just failed
+        if self.recently_failed(url):
+            raise requests.HTTPError(f"Recently failed: {url}")
+        with TRACER.span("image.download"):
+            return self._fetch(url)
+
+    def _fetch(self, url):
+        path = local_path(url)
+        if path is not None:
+            try:
+                return path.read_bytes()
+            except FileNotFoundError:
+                self._record_failure(url, 404)
+                raise
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            status = e.response.status_code if e.response is not None else None
+            self._record_failure(url, status)
+            raise
+        with self._lock:
+            self._failures.pop(url, None)
+        return response.content
+
+    def _record_failure(self, url, status):
+        """Remember a failed fetch, forgetting those past FAILURE_RETRY_SECONDS so the map stays bounded"""
+        now = time.time()
+        with self._lock:
+            self._failures.pop(url, None)
+            self._failures[url] = (now, status)
+            while self._failures:
+                oldest_url, (failed_at, _) = next(iter(self._failures.items()))
+                if now - failed_at < FAILURE_RETRY_SECONDS:
+                    break
+                del self._failures[oldest_url]
+
+    def _resize(self, data, size):
+        with TRACER.span("image.resize"):
+            return self._encode_resized(data, size)
+
+    def _encode_resized(self, data, size):
+        img = Image.open(BytesIO(data))
+        img.thumbnail(size)
+        if img.mode not in ("RGB", "RGBA") or self.format == "JPEG":
+            img = img.convert("RGB")
+        out = BytesIO()
+        img.save(out, format=self.format, quality=self.quality)
+        return out.getvalue()
+
+    def _original_name(self, url):
+        return f"{self._key(url)}.orig"
+
+    def _resized_name(self, url, size):
+        width, height = size
+        return f"{self._key(url)}_{width}x{height}.{self.suffix}"
+
+    def is_cached(self, url, size=None):
+        """Whether url at `size` (None: the original) is on disk, without fetching or touching LRU order"""
+        if size is None and local_path(url) is not None:
+            return True
+        name = self._original_name(url) if size is None else self._resized_name(url, tuple(size))
+        with self._lock:
+            return name in self._entries
+
+    def failure_status(self, url):
+        """HTTP status of a fetch of url that failed within FAILURE_RETRY_SECONDS
+
+        None if there was no recent failure; 0 if it failed without a status (timeout, refused).
+        """
+        failure = self._failures.get(url)
+        if failure is None or time.time() - failure[0] >= FAILURE_RETRY_SECONDS:
+            return None
+        return failure[1] or 0
+
+    def recently_failed(self, url):
+        return self.failure_status(url) is not None
+
+    def get_original(self, url):
+        """Local path of the full-resolution image, or None if it cannot be fetched"""
+        return self.fetch_original(url)[0]
+
+    def fetch_original(self, url):
+        """(get_original(url), bytes downloaded from the network to get it)"""
+        local = local_path(url)
+        if local is not None:
+            return (local if local.is_file() else None), 0
+        name = self._original_name(url)
+        path = self._hit(name)
+        TRACER.cache("image_original", path is not None)
+        if path is not None:
+            return path, 0
+        try:
+            data = self._download(url)
+            return self._store(name, data), len(data)
+        except (requests.RequestException, OSError):
+            return None, 0
+
+    def get_resized(self, url, size):
+        """Local path of url scaled to fit within size, or None if it cannot be fetched"""
+        return self.fetch_resized(url, size)[0]
+
+    def fetch_resized(self, url, size):
+        """(get_resized(url, size), bytes downloaded from the network to get it)
+
+        That is the size of the original, not of the resized copy kept on disk;
+        0 when it came from the cache or a local mirror.
+        """
+        name = self._resized_name(url, tuple(size))
+        path = self._hit(name)
+        TRACER.cache("image_resized", path is not None)
+        if path is not None:
+            return path, 0
+        # Reuse a cached original if someone already opened it
+        original = self._hit(self._original_name(url))
+        downloaded = 0
+        try:
+            if original is not None:
+                data = original.read_bytes()
+            else:
+                data = self._download(url)
+                if local_path(url) is None:
+                    downloaded = len(data)
+            return self._store(name, self._resize(data, size)), downloaded
+        except (requests.RequestException, OSError, Image.UnidentifiedImageError):
+            # A download that could not be resized still cost the bytes
+            return None, downloaded
+
+    def get_thumbnail(self, url):
+        """Local path of the grid thumbnail for url, or None if it cannot be fetched"""
+        return self.get_resized(url, self.thumbnail_size)
+
+    def get_thumbnails(self, urls, max_workers=POOL_SIZE):
+        """Thumbnail paths for many urls, fetched concurrently; None where a fetch failed"""
+        if not urls:
+            return []
+        with TRACER.span("image.thumbnails"), ThreadPoolExecutor(max_workers=min(max_workers, len(urls))) as pool:
+            return list(pool.map(self.get_thumbnail, urls))
+
+    def contact_sheet(self, urls, captions, columns=5, cell_size=CONTACT_SHEET_CELL):
+        """Contact sheet of the thumbnails for urls; see render_contact_sheet"""
+        thumbnails = self.get_thumbnails(urls)
+        with TRACER.span("image.contact_sheet"):
+            return render_contact_sheet(thumbnails, captions, columns, cell_size)
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
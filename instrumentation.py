@@ -0,0 +1,340 @@
+"""Startup instrumentation: deferred imports and import-time reports.
+
+`lazy_import("pandas")` returns a stand-in that imports the real module on
+first attribute access, so optional dependencies cost nothing until a
+feature uses them. Every deferred import records how long it took in
+`LAZY_IMPORT_TIMES`.
+
+`import_time_report()` runs `python -X importtime` in a subprocess and
+returns per-module self and cumulative times. From the command line:
+
+    python instrumentation.py importtime [module ...]
+
+`TRACER` times named spans on the hot path (`with TRACER.span("view.x"):`
+or `@traced("figure.x")`) and counts cache hits and misses. A span costs
+one attribute check unless it is recorded, which happens when either
+
+- a per-rerun trace is active on the current thread (`begin_trace()`, used
+  by the app's `?debug=perf` panel), or
+- `TRACER.enabled` is set, which aggregates every span of the process into
+  p50/p95/p99 summaries that `prometheus_text()` renders in the Prometheus
+  text format, for `serve_metrics()` or `write_metrics()` to export.
+"""
+import functools
+import http.server
+import importlib
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+
+# Modules the app imports at startup, in the order it imports them
+STARTUP_MODULES = [
+    "streamlit",
+    "numpy",
+    "requests",
+    "PIL.Image",
+    "plotly.graph_objects",
+    "neuron_store",
+    "neuron_analysis",
+    "metadata_cache",
+    "image_cache",
+]
+
+LAZY_IMPORT_TIMES = {}
+
+
+class LazyModule:
+    """Stand-in for a module that is imported on first attribute access"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    LAZY_IMPORT_TIMES[self._name] = time.perf_counter() - start
+                    self._module = module
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_import(name):
+    """Defer importing `name` until it is first used"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
+
+
+def import_time_report(modules=STARTUP_MODULES, top=25):
+    """[(module, self_seconds, cumulative_seconds), ...] slowest first
+
+    Measured in a fresh interpreter so modules already loaded in this process
+    don't hide their cost.
+    """
+    statement = "; ".join(f"import {name}" for name in modules)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        timeout=300,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3:
+            continue
+        try:
+            self_us, cumulative_us = int(fields[0]), int(fields[1])
+        except ValueError:
+            # The header line
+            continue
+        rows.append((fields[2].strip(), self_us / 1e6, cumulative_us / 1e6))
+    rows.sort(key=lambda row: row[2], reverse=True)
+    return rows[:top]
+
+
+def format_import_report(rows):
+    lines = [f"{'cumulative':>12}  {'self':>10}  module"]
+    for name, self_s, cumulative_s in rows:
+        lines.append(f"{cumulative_s * 1000:>10.1f}ms  {self_s * 1000:>8.1f}ms  {name}")
+    return "\n".join(lines)
+
+
+SPAN_SAMPLES = 2048
+QUANTILES = (0.5, 0.95, 0.99)
+METRIC_PREFIX = "clip_microscope"
+
+
+class _NoSpan:
+    """Span stand-in used when nothing is recording"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Span:
+    def __init__(self, tracer, name, trace):
+        self.tracer = tracer
+        self.name = name
+        self.trace = trace
+
+    def __enter__(self):
+        if self.trace is not None:
+            self.entry = [self.name, self.trace.depth, 0.0]
+            self.trace.entries.append(self.entry)
+            self.trace.depth += 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        if self.trace is not None:
+            self.entry[2] = elapsed
+            self.trace.depth -= 1
+        if self.tracer.enabled:
+            self.tracer.observe(self.name, elapsed)
+        return False
+
+
+class Trace:
+    """Spans of one rerun, in the order they started: [name, depth, seconds]"""
+
+    def __init__(self):
+        self.entries = []
+        self.depth = 0
+        self.start = time.perf_counter()
+
+    @property
+    def seconds(self):
+        return time.perf_counter() - self.start
+
+
+class Tracer:
+    """Span timings and cache hit counters, per rerun and aggregated per process"""
+
+    def __init__(self, enabled=False, samples=SPAN_SAMPLES):
+        self.enabled = enabled
+        self.samples = samples
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # name -> [count, total_seconds, recent samples]
+        self._spans = {}
+        # (cache, "hit"|"miss") -> count
+        self._cache_counts = {}
+
+    def span(self, name):
+        trace = getattr(self._local, "trace", None)
+        if trace is None and not self.enabled:
+            return _NO_SPAN
+        return _Span(self, name, trace)
+
+    def observe(self, name, seconds):
+        with self._lock:
+            stats = self._spans.get(name)
+            if stats is None:
+                stats = self._spans[name] = [0, 0.0, deque(maxlen=self.samples)]
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2].append(seconds)
+
+    def cache(self, cache, hit):
+        """Count a hit or miss of a named cache"""
+        if not self.enabled:
+            return
+        key = (cache, "hit" if hit else "miss")
+        with self._lock:
+            self._cache_counts[key] = self._cache_counts.get(key, 0) + 1
+
+    def begin_trace(self):
+        """Start recording this thread's spans; returns the Trace"""
+        trace = self._local.trace = Trace()
+        return trace
+
+    def end_trace(self):
+        trace = getattr(self._local, "trace", None)
+        self._local.trace = None
+        return trace
+
+    def summary(self):
+        """{span: (count, total_seconds, {quantile: seconds})} over recent samples"""
+        with self._lock:
+            spans = {name: (count, total, sorted(samples)) for name, (count, total, samples) in self._spans.items()}
+        return {
+            name: (count, total, {q: samples[min(int(q * len(samples)), len(samples) - 1)] for q in QUANTILES})
+            for name, (count, total, samples) in spans.items()
+        }
+
+    def cache_ratios(self):
+        """{cache: (hits, misses)}"""
+        with self._lock:
+            counts = dict(self._cache_counts)
+        caches = sorted({cache for cache, _ in counts})
+        return {cache: (counts.get((cache, "hit"), 0), counts.get((cache, "miss"), 0)) for cache in caches}
+
+    def prometheus_text(self):
+        """Aggregated metrics in the Prometheus text exposition format"""
+        lines = [
+            f"# HELP {METRIC_PREFIX}_span_seconds Time spent in instrumented spans",
+            f"# TYPE {METRIC_PREFIX}_span_seconds summary",
+        ]
+        for name, (count, total, quantiles) in sorted(self.summary().items()):
+            label = _label(name)
+            for q, seconds in quantiles.items():
+                lines.append(f'{METRIC_PREFIX}_span_seconds{{span="{label}",quantile="{q}"}} {seconds:.6f}')
+            lines.append(f'{METRIC_PREFIX}_span_seconds_sum{{span="{label}"}} {total:.6f}')
+            lines.append(f'{METRIC_PREFIX}_span_seconds_count{{span="{label}"}} {count}')
+
+        ratios = self.cache_ratios()
+        lines += [
+            f"# HELP {METRIC_PREFIX}_cache_requests_total Cache lookups by result",
+            f"# TYPE {METRIC_PREFIX}_cache_requests_total counter",
+        ]
+        for cache, (hits, misses) in ratios.items():
+            lines.append(f'{METRIC_PREFIX}_cache_requests_total{{cache="{_label(cache)}",result="hit"}} {hits}')
+            lines.append(f'{METRIC_PREFIX}_cache_requests_total{{cache="{_label(cache)}",result="miss"}} {misses}')
+        lines += [
+            f"# HELP {METRIC_PREFIX}_cache_hit_ratio Fraction of cache lookups that hit",
+            f"# TYPE {METRIC_PREFIX}_cache_hit_ratio gauge",
+        ]
+        for cache, (hits, misses) in ratios.items():
+            lines.append(f'{METRIC_PREFIX}_cache_hit_ratio{{cache="{_label(cache)}"}} {hits / max(hits + misses, 1):.4f}')
+        return "\n".join(lines) + "\n"
+
+
+def _label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+TRACER = Tracer()
+
+
+def traced(name):
+    """Decorator that runs the function inside TRACER.span(name)"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with TRACER.span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def format_trace(trace):
+    lines = [f"{'ms':>9}  span"]
+    for name, depth, seconds in trace.entries:
+        lines.append(f"{seconds * 1000:>9.1f}  {'  ' * depth}{name}")
+    lines.append(f"{trace.seconds * 1000:>9.1f}  total")
+    return "\n".join(lines)
+
+
+def serve_metrics(port, tracer=TRACER, host="127.0.0.1"):
+    """Serve tracer.prometheus_text() at http://host:port/metrics from a daemon thread"""
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = tracer.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+def write_metrics(path, tracer=TRACER):
+    """Atomically write tracer.prometheus_text() to path, e.g. for node_exporter's textfile collector"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(tracer.prometheus_text())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def main(argv):
+    if len(argv) < 2 or argv[1] != "importtime":
+        print("usage: python instrumentation.py importtime [module ...]")
+        return 2
+    modules = argv[2:] or STARTUP_MODULES
+    print(format_import_report(import_time_report(modules)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,128 @@
+"""Lucid feature visualizations: availability index and display-size variants.
+
+Not every neuron has a lucid image, and probing for a missing one costs a
+full request. `LucidCache` answers "does neuron N have one?" from the
+metadata listing, the images already on disk and a persistent record of
+404s. Negative entries expire after `missing_ttl`, so images published
+later are picked up. Images are decoded once and stored at DISPLAY_SIZES in
+the shared `ImageCache`, so every view gets a ready-made file at the width
+it shows.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from neuron_shards import ShardedMetadata
+from neuron_store import NeuronStore
+
+DISPLAY_SIZES = (150, 300, 600)
+MISSING_TTL = 24 * 3600
+MISSING_FILENAME = "missing.json"
+
+
+def lucid_listing(metadata):
+    """{neuron_id: bool} from the metadata's `lucid_image` entries, or None if it lists none"""
+    if isinstance(metadata, (NeuronStore, ShardedMetadata)):
+        neuron_ids, flags = np.asarray(metadata.neuron_ids), np.asarray(metadata.has_lucid)
+    else:
+        neuron_ids = np.array([int(nid) for nid in metadata], dtype=np.int64)
+        flags = np.array(["lucid_image" in data for data in metadata.values()], dtype=bool)
+    if not flags.any():
+        return None
+    return dict(zip(neuron_ids.tolist(), flags.tolist()))
+
+
+def display_size(width):
+    """Smallest DISPLAY_SIZES box at least `width` wide (the largest if none is)"""
+    for size in DISPLAY_SIZES:
+        if size >= width:
+            return (size, size)
+    return (DISPLAY_SIZES[-1], DISPLAY_SIZES[-1])
+
+
+class LucidCache:
+    """Lucid images for neurons, with negative caching of missing ones"""
+
+    def __init__(self, image_cache, url_for, cache_dir, listing=None, missing_ttl=MISSING_TTL):
+        self.image_cache = image_cache
+        self.url_for = url_for
+        self.cache_dir = Path(cache_dir)
+        self.listing = listing
+        self.missing_ttl = missing_ttl
+        self._lock = threading.Lock()
+        self._missing = self._load_missing()
+
+    def _load_missing(self):
+        try:
+            with open(self.cache_dir / MISSING_FILENAME) as f:
+                missing = {int(nid): float(ts) for nid, ts in json.load(f).items()}
+        except (OSError, ValueError, AttributeError):
+            return {}
+        now = time.time()
+        return {nid: ts for nid, ts in missing.items() if now - ts < self.missing_ttl}
+
+    def _save_missing(self):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            data = json.dumps({str(nid): ts for nid, ts in self._missing.items()}).encode("utf-8")
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self.cache_dir / MISSING_FILENAME)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _mark_missing(self, neuron_idx):
+        with self._lock:
+            self._missing[int(neuron_idx)] = time.time()
+        try:
+            self._save_missing()
+        except OSError:
+            pass
+
+    def is_missing(self, neuron_idx):
+        """True if the neuron is known to have no lucid image"""
+        neuron_idx = int(neuron_idx)
+        if self.listing is not None and not self.listing.get(neuron_idx, False):
+            return True
+        with self._lock:
+            missing_at = self._missing.get(neuron_idx)
+        if missing_at is not None and time.time() - missing_at < self.missing_ttl:
+            return True
+        # A prefetch may have hit the 404 already
+        if self.image_cache.failure_status(self.url_for(neuron_idx)) == 404:
+            self._mark_missing(neuron_idx)
+            return True
+        return False
+
+    def has_lucid(self, neuron_idx):
+        """Whether the neuron has a lucid image, answered without network access"""
+        if self.is_missing(neuron_idx):
+            return False
+        if self.listing is not None:
+            return True
+        url = self.url_for(int(neuron_idx))
+        return any(self.image_cache.is_cached(url, (size, size)) for size in DISPLAY_SIZES)
+
+    def get(self, neuron_idx, width=300):
+        """Local path of the lucid image sized for `width`, or None if there is none"""
+        if self.is_missing(neuron_idx):
+            return None
+        url = self.url_for(int(neuron_idx))
+        path = self.image_cache.get_resized(url, display_size(width))
+        if path is None and self.image_cache.failure_status(url) == 404:
+            self._mark_missing(neuron_idx)
+        return path
+
+    def prefetch_job(self, neuron_idx, width=300):
+        """(url, size) prefetch job for the neuron's lucid image, or None if it has none"""
+        if self.is_missing(neuron_idx):
+            return None
+        return self.url_for(int(neuron_idx)), display_size(width)
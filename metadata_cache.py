@@ -0,0 +1,153 @@
+"""Persistent on-disk cache for remote metadata files.
+
+Each URL is stored as `<key>.body` plus a `<key>.json` sidecar holding its
+`ETag`, `Last-Modified` and fetch time. Within `ttl` the local copy is used
+with no network access. After that a conditional request is sent: a 304
+refreshes the timestamp, and a new body replaces the old one. If the server
+is unreachable or returns an error, the last good copy is served as stale.
+So a restarted or newly scheduled process only downloads what has changed.
+
+`file://` URLs (a local mirror, see mirror.py) are read in place and never
+copied into the cache.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+import requests
+
+DEFAULT_TTL = 3600
+DEFAULT_TIMEOUT = (5, 60)
+
+
+class FetchError(Exception):
+    """Raised when a URL cannot be fetched and nothing is cached for it"""
+
+
+def local_path(url):
+    """Filesystem path of a file:// URL, or None for anything else"""
+    parsed = urlparse(url)
+    if parsed.scheme != "file":
+        return None
+    return Path(url2pathname(parsed.path))
+
+
+def as_base_url(location):
+    """Base URL for a dataset location: http(s) and file URLs as is, anything else is a local directory"""
+    if urlparse(location).scheme in ("http", "https", "file"):
+        return location.rstrip("/")
+    return Path(location).expanduser().resolve().as_uri()
+
+
+class CachedResponse:
+    def __init__(self, url, body_path, meta, from_cache, stale=False):
+        self.url = url
+        self.body_path = body_path
+        self.etag = meta.get("etag")
+        self.last_modified = meta.get("last_modified")
+        self.fetched_at = meta.get("fetched_at", 0)
+        self.from_cache = from_cache
+        self.stale = stale
+        self._content = None
+
+    @property
+    def content(self):
+        if self._content is None:
+            self._content = self.body_path.read_bytes()
+        return self._content
+
+    def json(self):
+        return json.loads(self.content)
+
+
+def _write_atomic(path, data):
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class MetadataCache:
+    """Disk cache with conditional revalidation for a handful of URLs"""
+
+    def __init__(self, cache_dir, ttl=DEFAULT_TTL, timeout=DEFAULT_TIMEOUT, session=None):
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+        self.timeout = timeout
+        self.session = session or requests.Session()
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()[:32]
+        return self.cache_dir / f"{key}.body", self.cache_dir / f"{key}.json"
+
+    def _read_meta(self, meta_path, body_path):
+        if not body_path.exists():
+            return None
+        try:
+            with open(meta_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, meta_path, meta):
+        _write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+
+    def fetch(self, url):
+        """Return a CachedResponse for url, going to the network only when needed"""
+        path = local_path(url)
+        if path is not None:
+            if not path.is_file():
+                raise FetchError(f"Could not fetch {url}: no such file")
+            return CachedResponse(url, path, {"fetched_at": path.stat().st_mtime}, from_cache=True)
+
+        body_path, meta_path = self._paths(url)
+        meta = self._read_meta(meta_path, body_path)
+        if meta is not None and time.time() - meta.get("fetched_at", 0) < self.ttl:
+            return CachedResponse(url, body_path, meta, from_cache=True)
+
+        headers = {}
+        if meta is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            if meta is not None:
+                return CachedResponse(url, body_path, meta, from_cache=True, stale=True)
+            raise FetchError(f"Could not fetch {url}: {e}") from e
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        if response.status_code == 304 and meta is not None:
+            meta["fetched_at"] = time.time()
+            self._write_meta(meta_path, meta)
+            return CachedResponse(url, body_path, meta, from_cache=True)
+
+        if response.status_code == 200:
+            # Body first, so a sidecar never describes a body it does not match
+            _write_atomic(body_path, response.content)
+            meta = {
+                "url": url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "fetched_at": time.time(),
+            }
+            self._write_meta(meta_path, meta)
+            cached = CachedResponse(url, body_path, meta, from_cache=False)
+            cached._content = response.content
+            return cached
+
+        if meta is not None:
+            return CachedResponse(url, body_path, meta, from_cache=True, stale=True)
+        raise FetchError(f"Failed to fetch {url}: {response.status_code}")
@@ -0,0 +1,317 @@
+"""Offline mirror of the CLIP Microscope dataset.
+
+Copies the metadata (and its sharded copy, if published), every
+top-activation image and every lucid image from the Hugging Face dataset
+(or any other copy of it) into a local directory with the same layout, so
+the app can run without outbound network access:
+
+    python mirror.py /data/clip-microscope [--base-url URL] [--workers 16]
+    CLIP_MICROSCOPE_DATA=/data/clip-microscope streamlit run neuron_microscope_advanced.py
+
+Each file is downloaded to a `.part` file and renamed when it is complete.
+Its size and sha256 are then appended to a journal, so an interrupted run
+picks up where it stopped. When the source publishes a sha256 (Hugging Face
+does for LFS files), the download is checked against it. At the end,
+`manifest.json` lists every mirrored file with its checksum, plus the
+files the source does not have. `--verify` re-hashes a finished mirror
+against its manifest.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import requests
+
+from dataset_layout import HF_BASE_URL, METADATA_PATH, SUMMARY_PATH, lucid_image_path, neuron_image_path
+from image_cache import make_session
+from neuron_shards import INDEX_FILENAME, SHARDS_DIR, shard_files
+
+SHARDS_INDEX = f"{SHARDS_DIR}/{INDEX_FILENAME}"
+# The shards index is optional; a source without it just records it as missing
+METADATA_FILES = (METADATA_PATH, SUMMARY_PATH, SHARDS_INDEX)
+MANIFEST_FILENAME = "manifest.json"
+JOURNAL_FILENAME = ".mirror-journal"
+DEFAULT_WORKERS = 16
+DEFAULT_TIMEOUT = (5, 60)
+CHUNK_SIZE = 256 * 1024
+PROGRESS_INTERVAL = 5
+MISSING = -1
+
+_SHA256 = re.compile(r'^"?([0-9a-f]{64})"?$')
+
+
+class ChecksumError(Exception):
+    """Raised when a download does not match the checksum the source published"""
+
+
+def dataset_files(metadata):
+    """Relative paths of every image the app can request, lucid images first"""
+    neuron_ids = sorted(int(nid) for nid in metadata)
+    paths = [lucid_image_path(nid) for nid in neuron_ids]
+    seen = set()
+    for nid in neuron_ids:
+        for images in metadata[str(nid)].get("top_images", {}).values():
+            for img in images:
+                path = neuron_image_path(nid, img["filename"])
+                if path not in seen:
+                    seen.add(path)
+                    paths.append(path)
+    return paths
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _published_sha256(headers):
+    # Hugging Face sends the LFS object id (a sha256) as X-Linked-Etag
+    for name in ("X-Linked-Etag", "ETag"):
+        match = _SHA256.match(headers.get(name, "").removeprefix("W/"))
+        if match:
+            return match.group(1)
+    return None
+
+
+def _format_bytes(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.1f} {unit}" if unit != "B" else f"{n} B"
+        n /= 1024
+
+
+class Mirror:
+    """Resumable, concurrent download of the dataset into out_dir"""
+
+    def __init__(self, out_dir, base_url=HF_BASE_URL, workers=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT,
+                 session=None, progress_interval=PROGRESS_INTERVAL, log=sys.stderr):
+        self.out_dir = Path(out_dir)
+        self.base_url = base_url.rstrip("/")
+        self.workers = workers
+        self.timeout = timeout
+        self.session = session or make_session(workers)
+        self.progress_interval = progress_interval
+        self.log = log
+        self.journal_path = self.out_dir / JOURNAL_FILENAME
+        self._lock = threading.Lock()
+
+    def load_journal(self):
+        """{path: (size, sha256)} of files already mirrored; size is MISSING for 404s"""
+        entries = {}
+        try:
+            with open(self.journal_path) as f:
+                for line in f:
+                    fields = line.rstrip("\n").split("\t")
+                    # A torn last line from an interrupted run is ignored
+                    if len(fields) == 3:
+                        size, sha256, path = fields
+                        entries[path] = (int(size), sha256 or None)
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def _is_done(self, path, entry, retry_missing):
+        size, _ = entry
+        if size == MISSING:
+            return not retry_missing
+        try:
+            return (self.out_dir / path).stat().st_size == size
+        except OSError:
+            return False
+
+    def fetch(self, path):
+        """Download one file; (size, sha256), or None if the source does not have it"""
+        target = self.out_dir / path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        part = target.with_name(target.name + ".part")
+        with self.session.get(f"{self.base_url}/{path}", stream=True, timeout=self.timeout) as response:
+            if response.status_code == 404:
+                return None
+            response.raise_for_status()
+            expected = _published_sha256(response.headers)
+            digest = hashlib.sha256()
+            size = 0
+            with open(part, "wb") as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+        sha256 = digest.hexdigest()
+        if expected is not None and sha256 != expected:
+            part.unlink()
+            raise ChecksumError(f"{path}: got sha256 {sha256}, source says {expected}")
+        os.replace(part, target)
+        return size, sha256
+
+    def run(self, paths, retry_missing=False):
+        """Mirror `paths`, skipping those the journal says are done; returns a summary dict"""
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        journal = self.load_journal()
+        todo = [p for p in paths if p not in journal or not self._is_done(p, journal[p], retry_missing)]
+        state = {
+            "total": len(todo), "done": 0, "bytes": 0, "missing": 0, "failed": [],
+            "start": time.monotonic(), "last_report": time.monotonic(),
+        }
+        if todo:
+            self.log.write(f"{len(paths) - len(todo):,} of {len(paths):,} files already mirrored, "
+                           f"fetching {len(todo):,} from {self.base_url}\n")
+
+        jobs = iter(todo)
+        with open(self.journal_path, "a+") as journal_file:
+            # Terminate a torn last line so the next entry starts cleanly
+            if journal_file.tell() > 0:
+                journal_file.seek(journal_file.tell() - 1)
+                if journal_file.read(1) != "\n":
+                    journal_file.write("\n")
+
+            def work():
+                while True:
+                    with self._lock:
+                        path = next(jobs, None)
+                    if path is None:
+                        return
+                    try:
+                        result = self.fetch(path)
+                        error = None
+                    except (requests.RequestException, OSError, ChecksumError) as e:
+                        result, error = None, e
+                    with self._lock:
+                        state["done"] += 1
+                        if error is not None:
+                            state["failed"].append((path, str(error)))
+                        elif result is None:
+                            state["missing"] += 1
+                            journal_file.write(f"{MISSING}\t\t{path}\n")
+                        else:
+                            state["bytes"] += result[0]
+                            journal_file.write(f"{result[0]}\t{result[1]}\t{path}\n")
+                        journal_file.flush()
+                        if time.monotonic() - state["last_report"] >= self.progress_interval:
+                            state["last_report"] = time.monotonic()
+                            self._report(state)
+
+            threads = [threading.Thread(target=work, daemon=True) for _ in range(min(self.workers, len(todo)))]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        if todo:
+            self._report(state)
+        return {
+            "fetched": state["done"] - state["missing"] - len(state["failed"]),
+            "bytes": state["bytes"],
+            "missing": state["missing"],
+            "failed": state["failed"],
+            "seconds": time.monotonic() - state["start"],
+        }
+
+    def _report(self, state):
+        elapsed = max(time.monotonic() - state["start"], 1e-9)
+        rate = state["done"] / elapsed
+        remaining = (state["total"] - state["done"]) / rate if rate else 0
+        percent = 100 * state["done"] / max(state["total"], 1)
+        self.log.write(
+            f"[{percent:5.1f}%] {state['done']:,}/{state['total']:,} files  "
+            f"{_format_bytes(state['bytes'])}  {_format_bytes(state['bytes'] / elapsed)}/s  "
+            f"{rate:.0f} files/s  ETA {int(remaining // 60)}m{int(remaining % 60):02d}s  "
+            f"({state['missing']} missing, {len(state['failed'])} failed)\n"
+        )
+        self.log.flush()
+
+    def write_manifest(self, paths):
+        """Write manifest.json for `paths` from the journal; returns it"""
+        journal = self.load_journal()
+        files, missing = {}, []
+        for path in paths:
+            entry = journal.get(path)
+            if entry is None:
+                continue
+            size, sha256 = entry
+            if size == MISSING:
+                missing.append(path)
+            else:
+                files[path] = {"size": size, "sha256": sha256}
+        manifest = {
+            "format": 1,
+            "source": self.base_url,
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "files": files,
+            "missing": missing,
+        }
+        tmp_path = self.out_dir / (MANIFEST_FILENAME + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.out_dir / MANIFEST_FILENAME)
+        return manifest
+
+    def verify(self):
+        """[(path, problem), ...] for files that no longer match the manifest"""
+        with open(self.out_dir / MANIFEST_FILENAME) as f:
+            manifest = json.load(f)
+        problems = []
+        for path, entry in manifest["files"].items():
+            local = self.out_dir / path
+            if not local.exists():
+                problems.append((path, "missing"))
+            elif local.stat().st_size != entry["size"]:
+                problems.append((path, "size mismatch"))
+            elif sha256_file(local) != entry["sha256"]:
+                problems.append((path, "checksum mismatch"))
+        return problems
+
+    def mirror_all(self, retry_missing=False):
+        """Mirror metadata, then every image it references; returns the summary"""
+        summary = self.run(list(METADATA_FILES), retry_missing=retry_missing)
+        metadata_path = self.out_dir / METADATA_FILES[0]
+        if not metadata_path.exists():
+            raise FileNotFoundError(f"{self.base_url}/{METADATA_FILES[0]} could not be mirrored")
+        with open(metadata_path) as f:
+            paths = list(METADATA_FILES) + dataset_files(json.load(f))
+        if (self.out_dir / SHARDS_INDEX).exists():
+            with open(self.out_dir / SHARDS_INDEX) as f:
+                paths += [f"{SHARDS_DIR}/{name}" for name in shard_files(json.load(f))]
+        images = self.run(paths, retry_missing=retry_missing)
+        for field in ("fetched", "bytes", "missing", "failed", "seconds"):
+            summary[field] += images[field]
+        self.write_manifest(paths)
+        return summary
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python mirror.py", description="Mirror the CLIP Microscope dataset locally")
+    parser.add_argument("out_dir")
+    parser.add_argument("--base-url", default=HF_BASE_URL)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--retry-missing", action="store_true", help="retry files the source returned 404 for")
+    parser.add_argument("--verify", action="store_true", help="check an existing mirror against its manifest")
+    args = parser.parse_args(argv[1:])
+
+    mirror = Mirror(args.out_dir, base_url=args.base_url, workers=args.workers)
+    if args.verify:
+        problems = mirror.verify()
+        for path, problem in problems:
+            print(f"{problem}: {path}")
+        print(f"{len(problems)} problem(s)")
+        return 1 if problems else 0
+
+    summary = mirror.mirror_all(retry_missing=args.retry_missing)
+    for path, error in summary["failed"]:
+        print(f"failed: {path}: {error}", file=sys.stderr)
+    print(f"Fetched {summary['fetched']:,} files ({_format_bytes(summary['bytes'])}) in {summary['seconds']:.0f}s; "
+          f"{summary['missing']:,} not on the source, {len(summary['failed']):,} failed")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,408 @@
+"""Vectorized analysis over the neuron metadata.
+
+These helpers work on a `NeuronStore` (using its column arrays directly), on
+`ShardedMetadata` or on the plain dict parsed from `neuron_metadata.json`.
+They import nothing from Streamlit, so batch jobs can use them too.
+"""
+import sys
+from dataclasses import dataclass
+
+import numpy as np
+
+from neuron_shards import ShardedMetadata
+from neuron_store import NeuronStore, save_npz
+
+SIMILARITY_FILENAME = "similarity.npz"
+STAT_PERCENTILES = (25, 50, 75, 95)
+HEATMAP_SHAPE = (10, 10)
+
+
+def scalar_column(metadata, field, default=0.0):
+    """(neuron_ids, float64 values) of a numeric neuron field, `default` where missing
+
+    Stores and sharded metadata answer from their columns without touching
+    per-neuron records.
+    """
+    if isinstance(metadata, (NeuronStore, ShardedMetadata)):
+        try:
+            values = np.array(metadata.scalar(field), dtype=np.float64)
+        except KeyError:
+            values = np.full(len(metadata), np.nan)
+        neuron_ids = np.asarray(metadata.neuron_ids)
+    else:
+        neuron_ids = np.array([int(nid) for nid in metadata], dtype=np.int64)
+        values = np.array([data.get(field, np.nan) for data in metadata.values()], dtype=np.float64)
+    values[np.isnan(values)] = default
+    return neuron_ids, values
+
+
+def activation_matrix(metadata, split="train", width=None):
+    """Stack top-image activations into (neuron_ids, (n, width) float32, counts)
+
+    Rows are NaN padded past each neuron's count; counts are -1 where a
+    neuron has no such split.
+    """
+    if isinstance(metadata, NeuronStore):
+        if split not in metadata.splits:
+            return metadata.neuron_ids, np.empty((len(metadata), 0), dtype=np.float32), np.full(len(metadata), -1)
+        activations = metadata.activations(split)
+        if width is not None:
+            activations = activations[:, :width]
+        return metadata.neuron_ids, np.asarray(activations), np.asarray(metadata.counts(split))
+
+    neuron_ids = np.array([int(nid) for nid in metadata], dtype=np.int32)
+    counts = np.full(len(neuron_ids), -1, dtype=np.int32)
+    rows = []
+    for row, data in enumerate(metadata.values()):
+        images = data.get("top_images", {}).get(split)
+        if images is not None:
+            counts[row] = len(images)
+            rows.append([img["activation"] for img in images[:width]])
+        else:
+            rows.append([])
+    max_len = max((len(r) for r in rows), default=0)
+    if width is not None:
+        max_len = min(max_len, width)
+    activations = np.full((len(rows), max_len), np.nan, dtype=np.float32)
+    for row, values in enumerate(rows):
+        activations[row, :len(values)] = values
+    return neuron_ids, activations, counts
+
+
+@dataclass(frozen=True)
+class NeuronStats:
+    """Summary of one neuron's top-image activations for one split"""
+
+    neuron: int
+    split: str
+    count: int
+    max: float
+    min: float
+    mean: float
+    percentiles: dict
+    selectivity_ratio: float
+    strong_count: int
+    selectivity_percent: float
+    dynamic_range: float
+    heatmap: np.ndarray
+
+
+def _stats_columns(activations, counts):
+    """Vectorized statistics for every row of a NaN-padded activation matrix"""
+    x = activations.astype(np.float64)
+    n = len(x)
+    has_data = counts > 0
+    columns = {"count": np.maximum(counts, 0)}
+    if x.shape[1] == 0 or not has_data.any():
+        for field in ("max", "min", "mean", "selectivity_ratio", "selectivity_percent", "dynamic_range"):
+            columns[field] = np.full(n, np.nan)
+        columns.update(strong_count=np.zeros(n, dtype=np.int64),
+                       percentiles={q: np.full(n, np.nan) for q in STAT_PERCENTILES},
+                       heatmap=np.zeros((n,) + HEATMAP_SHAPE))
+        return columns
+
+    # Rows without data would warn in the nan-reductions; give them a dummy value
+    x[~has_data, 0] = 0.0
+    max_act = np.nanmax(x, axis=1)
+    min_act = np.nanmin(x, axis=1)
+    mean_act = np.nanmean(x, axis=1)
+    percentiles = np.nanpercentile(x, STAT_PERCENTILES, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        selectivity_ratio = np.where(mean_act > 0, max_act / mean_act, 0.0)
+        # "Strong" activations exceed half of the neuron's max; NaN padding never does
+        strong_count = (x > (max_act * 0.5)[:, None]).sum(axis=1)
+        selectivity_percent = strong_count / np.maximum(counts, 1) * 100
+
+    cells = HEATMAP_SHAPE[0] * HEATMAP_SHAPE[1]
+    heatmap = np.zeros((n, cells))
+    width = min(cells, x.shape[1])
+    heatmap[:, :width] = np.nan_to_num(x[:, :width], nan=0.0)
+
+    missing = ~has_data
+    for column in (max_act, min_act, mean_act, selectivity_ratio, selectivity_percent):
+        column[missing] = np.nan
+    percentiles[:, missing] = np.nan
+    strong_count[missing] = 0
+    heatmap[missing] = 0.0
+    columns.update(
+        max=max_act,
+        min=min_act,
+        mean=mean_act,
+        percentiles={q: percentiles[i] for i, q in enumerate(STAT_PERCENTILES)},
+        selectivity_ratio=selectivity_ratio,
+        strong_count=strong_count,
+        selectivity_percent=selectivity_percent,
+        dynamic_range=max_act - min_act,
+        heatmap=heatmap.reshape((n,) + HEATMAP_SHAPE),
+    )
+    return columns
+
+
+def compute_neuron_stats(metadata, neuron_idx, split="train"):
+    """NeuronStats for one neuron, or None if it has no images in the split"""
+    if str(neuron_idx) not in metadata:
+        return None
+    if isinstance(metadata, NeuronStore):
+        row = metadata.row(neuron_idx)
+        if split not in metadata.splits or metadata.counts(split)[row] <= 0:
+            return None
+        count = int(metadata.counts(split)[row])
+        activations = np.asarray(metadata.activations(split)[row:row + 1, :count])
+    else:
+        images = metadata[str(neuron_idx)].get("top_images", {}).get(split)
+        if not images:
+            return None
+        activations = np.array([[img["activation"] for img in images]])
+    return neuron_stats(neuron_idx, split, activations)
+
+
+def neuron_stats(neuron_idx, split, activations):
+    """NeuronStats from one neuron's top-image activations, a (1, count) or (count,) array; None if empty"""
+    activations = np.asarray(activations).reshape(1, -1)
+    count = activations.shape[1]
+    if not count:
+        return None
+    columns = _stats_columns(activations, np.array([count]))
+    return NeuronStats(
+        neuron=int(neuron_idx),
+        split=split,
+        count=count,
+        max=float(columns["max"][0]),
+        min=float(columns["min"][0]),
+        mean=float(columns["mean"][0]),
+        percentiles={q: float(values[0]) for q, values in columns["percentiles"].items()},
+        selectivity_ratio=float(columns["selectivity_ratio"][0]),
+        strong_count=int(columns["strong_count"][0]),
+        selectivity_percent=float(columns["selectivity_percent"][0]),
+        dynamic_range=float(columns["dynamic_range"][0]),
+        heatmap=columns["heatmap"][0],
+    )
+
+
+def batch_neuron_stats(metadata, split="train"):
+    """NeuronStats fields for every neuron at once, as columns
+
+    Returns a dict of arrays aligned with `neuron_ids`; `percentiles` maps each
+    of STAT_PERCENTILES to a column and `heatmap` is (n, 10, 10). Neurons
+    without images in the split get NaN.
+    """
+    neuron_ids, activations, counts = activation_matrix(metadata, split)
+    columns = _stats_columns(activations, counts)
+    columns["neuron_ids"] = neuron_ids
+    return columns
+
+
+class SimilarityIndex:
+    """Top-k most correlated neurons for every neuron
+
+    Similarity is the Pearson correlation of the first `window` top-image
+    activations, the same measure the Neuron Network tab has always used,
+    computed for all pairs at once. Neighbours are kept as int16/float16 so
+    the whole index stays a few MB even with hundreds per neuron.
+    """
+
+    def __init__(self, neuron_ids, neighbors, scores):
+        self.neuron_ids = neuron_ids
+        self.neighbors = neighbors
+        self.scores = scores
+        self._rows = {int(nid): row for row, nid in enumerate(neuron_ids.tolist())}
+
+    @classmethod
+    def build(cls, metadata, split="train", window=20, k=256, block_size=512):
+        neuron_ids, activations, counts = activation_matrix(metadata, split, width=window)
+        n = len(neuron_ids)
+        k = max(min(k, n - 1), 0)
+        id_dtype = np.int16 if n and neuron_ids.max() <= np.iinfo(np.int16).max else np.int32
+        neighbors = np.full((n, k), -1, dtype=id_dtype)
+        scores = np.full((n, k), np.nan, dtype=np.float16)
+
+        # Standardize rows; neurons with short or constant windows have no correlation
+        x = activations.astype(np.float64)
+        valid = counts >= window
+        if x.shape[1] == window:
+            centered = x - x.mean(axis=1, keepdims=True)
+            norms = np.linalg.norm(centered, axis=1)
+            valid &= norms > 0
+        else:
+            valid[:] = False
+        valid_rows = np.flatnonzero(valid)
+        if len(valid_rows) < 2 or k == 0:
+            return cls(neuron_ids, neighbors, scores)
+        z = (centered[valid_rows] / norms[valid_rows, None]).astype(np.float32)
+
+        # Correlate one block of rows against everything to bound memory
+        k_valid = min(k, len(valid_rows) - 1)
+        for start in range(0, len(valid_rows), block_size):
+            block = z[start:start + block_size]
+            corr = block @ z.T
+            np.fill_diagonal(corr[:, start:start + len(block)], -np.inf)
+            top = np.argpartition(-corr, k_valid - 1, axis=1)[:, :k_valid]
+            top_scores = np.take_along_axis(corr, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind="stable")
+            top = np.take_along_axis(top, order, axis=1)
+            rows = valid_rows[start:start + len(block)]
+            neighbors[rows, :k_valid] = neuron_ids[valid_rows[top]]
+            scores[rows, :k_valid] = np.take_along_axis(top_scores, order, axis=1)
+        return cls(neuron_ids, neighbors, scores)
+
+    def most_similar(self, neuron_idx, top_n=20):
+        """[(neuron_id, similarity), ...] best first; empty if unknown"""
+        row = self._rows.get(int(neuron_idx))
+        if row is None:
+            return []
+        ids = self.neighbors[row, :top_n]
+        keep = ids >= 0
+        return list(zip(ids[keep].tolist(), self.scores[row, :top_n][keep].astype(float).tolist()))
+
+    def save(self, path):
+        save_npz(path, neuron_ids=self.neuron_ids, neighbors=self.neighbors, scores=self.scores)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["neuron_ids"], data["neighbors"], data["scores"])
+
+
+class ActivationRangeIndex:
+    """Neurons sorted by numeric fields, for range, nearest-value and sampling queries
+
+    Each field is kept as its values sorted ascending, the neuron ids in that
+    order and every neuron's position in it, so a range is two binary
+    searches and the k nearest values are a window around one. Missing
+    values count as 0, as the sidebar buttons have always treated them.
+    """
+
+    def __init__(self, neuron_ids, columns):
+        self.neuron_ids = np.asarray(neuron_ids)
+        self._rows = {int(nid): row for row, nid in enumerate(self.neuron_ids.tolist())}
+        self._values = {}
+        self._sorted = {}
+        self._ids = {}
+        self._positions = {}
+        for field, values in columns.items():
+            order = np.argsort(values, kind="stable")
+            positions = np.empty(len(order), dtype=np.int64)
+            positions[order] = np.arange(len(order))
+            self._values[field] = values
+            self._sorted[field] = values[order]
+            self._ids[field] = self.neuron_ids[order]
+            self._positions[field] = positions
+
+    @classmethod
+    def build(cls, metadata, fields=("max_activation", "mean_activation")):
+        columns = {}
+        neuron_ids = None
+        for field in fields:
+            neuron_ids, columns[field] = scalar_column(metadata, field)
+        return cls(neuron_ids if neuron_ids is not None else np.empty(0, dtype=np.int64), columns)
+
+    @property
+    def fields(self):
+        return list(self._sorted)
+
+    def value(self, neuron_idx, field="max_activation"):
+        """The neuron's value of field, or None if the neuron is unknown"""
+        row = self._rows.get(int(neuron_idx))
+        return None if row is None else float(self._values[field][row])
+
+    def _bounds(self, field, low, high):
+        # Open interval, like the abs(a - b) < tolerance checks it replaces
+        values = self._sorted[field]
+        return np.searchsorted(values, low, side="right"), np.searchsorted(values, high, side="left")
+
+    def _excluded_position(self, field, exclude, start, end):
+        row = None if exclude is None else self._rows.get(int(exclude))
+        if row is None:
+            return None
+        position = int(self._positions[field][row])
+        return position if start <= position < end else None
+
+    def in_range(self, field, low, high, exclude=None):
+        """Ids of neurons with low < value < high, in ascending order of value"""
+        start, end = self._bounds(field, low, high)
+        ids = self._ids[field][start:end]
+        skip = self._excluded_position(field, exclude, start, end)
+        return ids if skip is None else np.delete(ids, skip - start)
+
+    def count(self, field, low, high, exclude=None):
+        """Number of neurons with low < value < high"""
+        start, end = self._bounds(field, low, high)
+        return int(end - start) - (self._excluded_position(field, exclude, start, end) is not None)
+
+    def nearest(self, field, value, k=5, tolerance=None, exclude=None):
+        """[(neuron_id, value), ...] for the k neurons closest to value, closest first
+
+        With `tolerance`, only neurons strictly within it are returned.
+        """
+        values = self._sorted[field]
+        pos = int(np.searchsorted(values, value))
+        # One extra on each side covers the excluded neuron
+        start, end = max(pos - k - 1, 0), min(pos + k + 1, len(values))
+        positions = np.arange(start, end)
+        skip = self._excluded_position(field, exclude, start, end)
+        if skip is not None:
+            positions = positions[positions != skip]
+        distance = np.abs(values[positions] - value)
+        positions = positions[np.argsort(distance, kind="stable")][:k]
+        if tolerance is not None:
+            positions = positions[np.abs(values[positions] - value) < tolerance]
+        return list(zip(self._ids[field][positions].tolist(), values[positions].astype(float).tolist()))
+
+    def sample(self, field, low, high, exclude=None, rng=None):
+        """A uniformly random neuron with low < value < high, or None if there is none"""
+        start, end = self._bounds(field, low, high)
+        skip = self._excluded_position(field, exclude, start, end)
+        size = int(end - start) - (skip is not None)
+        if size <= 0:
+            return None
+        rng = rng if rng is not None else np.random.default_rng()
+        position = start + int(rng.integers(size))
+        if skip is not None and position >= skip:
+            position += 1
+        return int(self._ids[field][position])
+
+    def filter(self, **ranges):
+        """Ids of neurons inside every (low, high) range given per field, ascending
+
+        e.g. index.filter(max_activation=(2.0, 4.0), mean_activation=(1.0, 2.0)).
+        Starts from the narrowest range, so the cost follows the smallest result.
+        """
+        if not ranges:
+            return np.sort(self.neuron_ids)
+        bounds = {field: self._bounds(field, low, high) for field, (low, high) in ranges.items()}
+        fields = sorted(bounds, key=lambda f: bounds[f][1] - bounds[f][0])
+        start, end = bounds[fields[0]]
+        rows = np.array([self._rows[nid] for nid in self._ids[fields[0]][start:end].tolist()], dtype=np.int64)
+        for field in fields[1:]:
+            start, end = bounds[field]
+            positions = self._positions[field][rows] if len(rows) else rows
+            rows = rows[(positions >= start) & (positions < end)]
+        return np.sort(self.neuron_ids[rows])
+
+
+def main(argv):
+    # Imported here: these index modules depend on this one, not the reverse
+    from class_index import CLASS_INDEX_FILENAME, CLASS_SEARCH_FILENAME, ClassHistogramIndex, ClassSearchIndex
+    from global_stats import GLOBAL_STATS_FILENAME, GlobalStats
+    from neuron_atlas import ATLAS_FILENAME, NeuronAtlas
+
+    indexes = {
+        "similarity": (SimilarityIndex, SIMILARITY_FILENAME),
+        "classes": (ClassHistogramIndex, CLASS_INDEX_FILENAME),
+        "class-search": (ClassSearchIndex, CLASS_SEARCH_FILENAME),
+        "global-stats": (GlobalStats, GLOBAL_STATS_FILENAME),
+        "atlas": (NeuronAtlas, ATLAS_FILENAME),
+    }
+    if len(argv) != 3 or argv[1] not in indexes:
+        print(f"usage: python neuron_analysis.py {{{'|'.join(indexes)}}} <store_dir>")
+        return 2
+    index_cls, filename = indexes[argv[1]]
+    store = NeuronStore.open(argv[2])
+    index = index_cls.build(store)
+    index.save(store.path / filename)
+    print(f"Wrote {store.path / filename}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,170 @@
+"""2-D atlas of all neurons for the Neuron Atlas view.
+
+Each neuron is described by the shape of its top activations and by the
+ImageNet classes of its top images. The profiles are reduced with PCA, and
+t-SNE lays the result out in 2-D, so neurons with similar profiles end up
+close together. t-SNE takes tens of seconds for 2,560 neurons, so the
+atlas is built once per metadata version, either ahead of time or in the
+background, and saved like the other indexes:
+
+    python neuron_analysis.py atlas store/
+
+New neurons do not need a new layout. `NeuronAtlas.extend()` projects
+them with the saved PCA basis and places each one at the distance-weighted
+mean of its nearest laid-out neighbours.
+"""
+
+import numpy as np
+
+from class_index import class_labels
+from neuron_analysis import activation_matrix
+from neuron_store import save_npz
+
+ATLAS_FILENAME = "atlas.npz"
+ACTIVATION_WINDOW = 20
+CLASS_WINDOW = 50
+ACTIVATION_WEIGHT = 0.5
+PCA_COMPONENTS = 50
+PERPLEXITY = 30
+EXTEND_NEIGHBORS = 10
+
+
+def _unit_rows(x):
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return np.divide(x, norms, out=np.zeros_like(x), where=norms > 0)
+
+
+def atlas_features(metadata, classes=None, split="train"):
+    """(neuron_ids, classes, (n, d) float32 profiles, top class id per neuron or -1)
+
+    A profile is the neuron's first ACTIVATION_WINDOW activations relative to
+    its maximum, next to the square-rooted class shares of its first
+    CLASS_WINDOW top images; each part is scaled to unit length. Pass the
+    `classes` of an existing atlas to get columns in its order; classes it
+    does not know are left out.
+    """
+    neuron_ids, activations, _ = activation_matrix(metadata, split, width=ACTIVATION_WINDOW)
+    profile = np.zeros((len(neuron_ids), ACTIVATION_WINDOW), dtype=np.float32)
+    width = min(activations.shape[1], ACTIVATION_WINDOW)
+    profile[:, :width] = np.nan_to_num(activations[:, :width], nan=0.0)
+    peaks = profile.max(axis=1, keepdims=True)
+    profile = np.divide(profile, peaks, out=np.zeros_like(profile), where=peaks > 0)
+
+    label_classes, _, labels = class_labels(metadata, split, window=CLASS_WINDOW)
+    if classes is None:
+        classes = label_classes
+        mapped = labels
+    else:
+        class_ids = {wnid: i for i, wnid in enumerate(classes)}
+        lookup = np.array([class_ids.get(wnid, -1) for wnid in label_classes] + [-1], dtype=np.int64)
+        mapped = lookup[labels]
+    rows = np.repeat(np.arange(len(neuron_ids)), mapped.shape[1])
+    flat = mapped.ravel()
+    keep = flat >= 0
+    histogram = np.zeros((len(neuron_ids), len(classes)), dtype=np.float32)
+    np.add.at(histogram, (rows[keep], flat[keep]), 1)
+    top_class = np.where(histogram.any(axis=1), histogram.argmax(axis=1), -1)
+
+    features = np.hstack([ACTIVATION_WEIGHT * _unit_rows(profile), _unit_rows(np.sqrt(histogram))])
+    return np.asarray(neuron_ids), list(classes), features.astype(np.float32), top_class
+
+
+class NeuronAtlas:
+    """2-D positions of neurons, plus the PCA basis that places new ones"""
+
+    def __init__(self, neuron_ids, coords, top_class, classes, mean, components, embedded):
+        self.neuron_ids = neuron_ids
+        self.coords = coords
+        self.top_class = top_class
+        self.classes = list(classes)
+        self.mean = mean
+        self.components = components
+        self.embedded = embedded
+        self._rows = {int(nid): row for row, nid in enumerate(neuron_ids.tolist())}
+
+    @classmethod
+    def build(cls, metadata, split="train", random_state=0):
+        # scikit-learn is slow to import and only needed here
+        from sklearn.decomposition import PCA
+        from sklearn.manifold import TSNE
+
+        neuron_ids, classes, features, top_class = atlas_features(metadata, split=split)
+        n_components = max(min(PCA_COMPONENTS, len(neuron_ids), features.shape[1]), 1)
+        if len(neuron_ids) < 3:
+            coords = np.zeros((len(neuron_ids), 2), dtype=np.float32)
+            mean = features.mean(axis=0) if len(features) else np.zeros(features.shape[1], dtype=np.float32)
+            components = np.zeros((0, features.shape[1]), dtype=np.float32)
+            return cls(neuron_ids, coords, top_class, classes, mean, components,
+                       np.zeros((len(neuron_ids), 0), dtype=np.float32))
+
+        pca = PCA(n_components=n_components, random_state=random_state)
+        embedded = pca.fit_transform(features).astype(np.float32)
+        tsne = TSNE(n_components=2, init="pca", perplexity=min(PERPLEXITY, len(neuron_ids) - 1),
+                    random_state=random_state)
+        coords = tsne.fit_transform(embedded).astype(np.float32)
+        return cls(neuron_ids, coords, top_class, classes, pca.mean_.astype(np.float32),
+                   pca.components_.astype(np.float32), embedded)
+
+    def __len__(self):
+        return len(self.neuron_ids)
+
+    def position(self, neuron_idx):
+        """(x, y) of a neuron, or None if it is not in the atlas"""
+        row = self._rows.get(int(neuron_idx))
+        return None if row is None else tuple(self.coords[row].tolist())
+
+    def extend(self, metadata, split="train"):
+        """Atlas for `metadata`: neurons no longer in it dropped, new ones placed near their neighbours
+
+        Returns self if nothing changed. Existing positions never move.
+        """
+        present = {int(nid) for nid in metadata}
+        keep = np.array([int(nid) in present for nid in self.neuron_ids.tolist()], dtype=bool)
+        missing = [key for key in metadata if int(key) not in self._rows]
+        if keep.all() and not missing:
+            return self
+
+        neuron_ids, coords = self.neuron_ids[keep], self.coords[keep]
+        top_class, embedded = self.top_class[keep], self.embedded[keep]
+        if missing and len(neuron_ids) and len(self.components):
+            new_ids, _, features, new_top = atlas_features(
+                {key: metadata[key] for key in missing}, classes=self.classes, split=split)
+            new_embedded = ((features - self.mean) @ self.components.T).astype(np.float32)
+            # Distances to every laid-out neuron, in the PCA space the layout was made from
+            distances = np.sqrt(np.maximum(
+                (new_embedded ** 2).sum(axis=1)[:, None] - 2 * new_embedded @ embedded.T
+                + (embedded ** 2).sum(axis=1)[None, :], 0.0))
+            k = min(EXTEND_NEIGHBORS, len(neuron_ids))
+            nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+            weights = 1.0 / (np.take_along_axis(distances, nearest, axis=1) + 1e-6)
+            new_coords = (weights[:, :, None] * coords[nearest]).sum(axis=1) / weights.sum(axis=1, keepdims=True)
+            neuron_ids = np.concatenate([neuron_ids, new_ids])
+            coords = np.vstack([coords, new_coords.astype(np.float32)])
+            top_class = np.concatenate([top_class, new_top])
+            embedded = np.vstack([embedded, new_embedded])
+        return NeuronAtlas(neuron_ids, coords, top_class, self.classes, self.mean, self.components, embedded)
+
+    def save(self, path):
+        save_npz(
+            path,
+            neuron_ids=self.neuron_ids,
+            coords=self.coords,
+            top_class=self.top_class,
+            classes=np.array(self.classes),
+            mean=self.mean,
+            components=self.components,
+            embedded=self.embedded,
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                data["neuron_ids"],
+                data["coords"],
+                data["top_class"],
+                data["classes"].tolist(),
+                data["mean"],
+                data["components"],
+                data["embedded"],
+            )
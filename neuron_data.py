@@ -0,0 +1,84 @@
+"""Opening the neuron metadata and its derived indexes, outside of Streamlit.
+
+The app and the headless API (api.py) load data the same way:
+
+- `open_metadata()` returns a local store if one is configured, else the
+  sharded metadata if the dataset publishes it, else a store built once per
+  metadata version from the full JSON.
+- `load_or_build_index()` returns an analysis index published with the
+  metadata, or the copy cached for this version under `cache_dir`, building
+  and caching it if neither exists. Processes that share `cache_dir` reuse
+  each other's builds; two that miss the cache at the same time both build
+  the index, and the last to save it wins.
+- `load_published()` returns an index that cannot be derived from the
+  metadata, such as the activation sketches, if the dataset publishes one.
+"""
+from dataset_layout import METADATA_PATH
+from neuron_shards import DEFAULT_MAX_SHARDS, SHARDS_DIR, ShardedMetadata
+from neuron_store import NeuronStore, build_store, is_store, source_version
+from metadata_cache import FetchError
+
+
+def metadata_version(metadata):
+    return getattr(metadata, "version", None)
+
+
+def open_metadata(base_url, fetch, cache_dir, store_dir=None, max_shards=DEFAULT_MAX_SHARDS):
+    """Neuron metadata for the dataset at base_url; raises FetchError if it cannot be reached
+
+    `fetch(url)` is `MetadataCache.fetch` or anything returning the same kind
+    of response.
+    """
+    if store_dir:
+        return NeuronStore.open(store_dir)
+
+    # A sharded copy, if published, only needs its index up front
+    try:
+        return ShardedMetadata.open(f"{base_url}/{SHARDS_DIR}", fetch, max_shards=max_shards)
+    except FetchError:
+        pass
+
+    response = fetch(f"{base_url}/{METADATA_PATH}")
+    # Build the store once per metadata version; other workers reuse it
+    version = source_version(response.content)
+    local_store = cache_dir / "store" / version
+    if not is_store(local_store):
+        build_store(response.json(), local_store, version=version)
+    return NeuronStore.open(local_store)
+
+
+def cached_index_path(cache_dir, version, filename):
+    """Where the index built for this metadata version is cached"""
+    return cache_dir / "index" / version / filename
+
+
+def load_or_build_index(metadata, version, filename, index_cls, cache_dir):
+    """Load a derived index prebuilt with the metadata or cached for this version, else build and cache it"""
+    prebuilt = metadata.prebuilt(filename) if isinstance(metadata, (NeuronStore, ShardedMetadata)) else None
+    if prebuilt is not None:
+        return index_cls.load(prebuilt)
+    if version is None:
+        return index_cls.build(metadata)
+
+    cached = cached_index_path(cache_dir, version, filename)
+    if cached.exists():
+        return index_cls.load(cached)
+    index = index_cls.build(metadata)
+    try:
+        index.save(cached)
+    except OSError:
+        # Another process sharing cache_dir may have saved it first; its copy is as good as ours
+        if not cached.exists():
+            raise
+    return index
+
+
+def load_published(metadata, filename, index_cls, base_url, fetch):
+    """Index prebuilt with the store or shards, else published as metadata/<filename>; None if neither exists"""
+    prebuilt = metadata.prebuilt(filename) if isinstance(metadata, (NeuronStore, ShardedMetadata)) else None
+    if prebuilt is not None:
+        return index_cls.load(prebuilt)
+    try:
+        return index_cls.load(fetch(f"{base_url}/metadata/{filename}").body_path)
+    except FetchError:
+        return None
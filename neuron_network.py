@@ -0,0 +1,80 @@
+"""Similarity neighbourhoods of a neuron and their force-directed layout.
+
+`neighborhood()` walks the `SimilarityIndex` outwards from one neuron: its
+`top_n` most similar neurons, then (for `hops=2`) a few of theirs, and
+keeps every similarity edge between the collected neurons. `force_layout()`
+places the result with a vectorized Fruchterman-Reingold simulation in
+which more similar neurons pull harder, so tight groups show up as
+clusters. Both run on the server and are cached with the figure.
+"""
+import numpy as np
+
+HOP_FANOUT = 5
+MAX_NODES = 1000
+LAYOUT_ITERATIONS = 80
+
+
+def neighborhood(similarity_index, neuron_idx, top_n=20, hops=1, fanout=HOP_FANOUT, max_nodes=MAX_NODES):
+    """(node ids, hop of each node, (m, 2) edge endpoints as node positions, edge similarities)
+
+    Node 0 is `neuron_idx`. Each hop after the first adds the `fanout` most
+    similar neurons of the previous hop's nodes, up to `max_nodes` nodes.
+    """
+    nodes = [int(neuron_idx)]
+    positions = {int(neuron_idx): 0}
+    node_hops = [0]
+    edges = {}
+    frontier = [int(neuron_idx)]
+    for hop in range(1, hops + 1):
+        width = top_n if hop == 1 else fanout
+        next_frontier = []
+        for source in frontier:
+            for neighbor, similarity in similarity_index.most_similar(source, width):
+                if neighbor not in positions:
+                    if len(nodes) >= max_nodes:
+                        continue
+                    positions[neighbor] = len(nodes)
+                    nodes.append(neighbor)
+                    node_hops.append(hop)
+                    next_frontier.append(neighbor)
+                pair = tuple(sorted((positions[source], positions[neighbor])))
+                edges[pair] = max(edges.get(pair, -np.inf), similarity)
+        frontier = next_frontier
+
+    endpoints = np.array(list(edges), dtype=np.int64).reshape(-1, 2)
+    return np.array(nodes), np.array(node_hops), endpoints, np.array(list(edges.values()), dtype=np.float64)
+
+
+def force_layout(n, edges, weights, iterations=LAYOUT_ITERATIONS, seed=0):
+    """(n, 2) positions in [-1, 1] from a Fruchterman-Reingold simulation, node 0 pinned at the origin
+
+    `weights` scale the pull of each edge; negative similarities do not attract.
+    """
+    rng = np.random.default_rng(seed)
+    pos = rng.uniform(-1, 1, size=(n, 2))
+    pos[0] = 0.0
+    if n < 2:
+        return pos
+    k = np.sqrt(4.0 / n)
+    pull = np.clip(weights, 0.0, None)
+    temperature = 0.2
+    cooling = temperature / (iterations + 1)
+    for _ in range(iterations):
+        # Every pair repels; float32 coordinate planes keep this fast for ~1000 nodes
+        x, y = pos[:, 0].astype(np.float32), pos[:, 1].astype(np.float32)
+        dx, dy = x[:, None] - x[None, :], y[:, None] - y[None, :]
+        inverse = 1.0 / np.maximum(dx * dx + dy * dy, 1e-6)
+        displacement = k * k * np.stack([(dx * inverse).sum(axis=1), (dy * inverse).sum(axis=1)], axis=1)
+        # Edges attract in proportion to their similarity
+        if len(edges):
+            edge_delta = pos[edges[:, 0]] - pos[edges[:, 1]]
+            edge_distance = np.maximum(np.linalg.norm(edge_delta, axis=1), 1e-3)
+            force = edge_delta * (edge_distance / k * pull)[:, None]
+            np.add.at(displacement, edges[:, 0], -force)
+            np.add.at(displacement, edges[:, 1], force)
+        length = np.maximum(np.linalg.norm(displacement, axis=1), 1e-9)
+        pos += displacement / length[:, None] * np.minimum(length, temperature)[:, None]
+        pos[0] = 0.0
+        temperature -= cooling
+    scale = np.abs(pos).max()
+    return pos / scale if scale > 0 else pos
@@ -0,0 +1,351 @@
+"""Everything a neuron's page shows, gathered in one pass.
+
+Each panel of the page used to look the neuron up in the metadata and derive
+its own numbers. The header read the scalars, the dashboard recomputed stats
+and classes, and the network tab searched for neurons with a similar max
+activation: a dozen lookups per rerun. `build_page()` reads the neuron's
+record once and asks each analysis index once. It returns a `NeuronPage`
+with the scalars, the stats record (over all images where activation
+sketches exist), the ImageNet classes, the most similar neurons, the top
+image URLs and the data behind the distribution and heatmap figures.
+
+The app keeps pages in a `PageCache` shared by all sessions, so going back
+to a neuron costs one dictionary lookup. The pages of every neuron can also
+be prebuilt offline into `neuron_pages.npz` (`PageTable`). Like the other
+indexes, that file is published with the store or the metadata:
+
+    python neuron_page.py store/ [--splits train,val]
+"""
+import argparse
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from activation_sketch import SKETCHES_FILENAME, ActivationSketches, full_distribution_stats
+from class_index import CLASS_INDEX_FILENAME, ClassHistogramIndex
+from dataset_layout import neuron_image_path
+from global_stats import metadata_splits
+from instrumentation import TRACER
+from neuron_analysis import (
+    HEATMAP_SHAPE, SIMILARITY_FILENAME, STAT_PERCENTILES, ActivationRangeIndex, NeuronStats, SimilarityIndex,
+    neuron_stats,
+)
+from neuron_data import load_or_build_index
+from neuron_store import NeuronStore, save_npz
+
+PAGES_FILENAME = "neuron_pages.npz"
+DEFAULT_CACHE_PAGES = 512
+PAGE_CLASSES = 10
+PAGE_SIMILAR = 20
+PAGE_SIMILAR_MAX = 5
+SIMILAR_MAX_TOLERANCE = 0.5
+TOP_HISTOGRAM_BINS = 30
+
+
+@dataclass(frozen=True)
+class NeuronPage:
+    """What the app shows for one neuron and split; treat as read-only, it is shared across sessions"""
+
+    neuron: int
+    split: str
+    max_activation: float
+    mean_activation: float
+    top_image_count: int  # train top images, whatever the split
+    filenames: tuple
+    image_urls: tuple
+    activations: tuple
+    stats: NeuronStats  # None without images in the split
+    full_distribution: bool  # stats are over every image in the split, not just the top ones
+    classes: tuple  # ((wnid, count), ...), most frequent first
+    similar: tuple  # ((neuron, similarity), ...), most similar first
+    similar_max: tuple  # neurons with the closest max activation, closest first
+    distribution: dict  # histogram of the train activations (see distribution_spec), or None
+
+
+def distribution_spec(neuron_idx, train_activations, sketches=None):
+    """Histogram behind the distribution figure: over all train images from the sketch, else over the top ones
+
+    A dict of `counts`, bin `edges`, `mean`, `images` (the train images
+    counted, None when only the top ones are), and `top_cutoff` and
+    `top_count` of the top images. None without train images.
+    """
+    if not len(train_activations):
+        return None
+    top = {"top_cutoff": float(np.min(train_activations)), "top_count": len(train_activations)}
+    if sketches is not None and sketches.has(neuron_idx, "train"):
+        counts, edges = sketches.histogram(neuron_idx, "train")
+        return {"counts": counts, "edges": edges, "mean": sketches.mean(neuron_idx, "train"),
+                "images": sketches.count("train"), **top}
+    counts, edges = np.histogram(train_activations, bins=TOP_HISTOGRAM_BINS)
+    return {"counts": counts, "edges": edges, "mean": float(np.mean(train_activations)), "images": None, **top}
+
+
+def image_urls(base_url, neuron_idx, filenames):
+    return tuple(f"{base_url}/{neuron_image_path(neuron_idx, filename)}" for filename in filenames)
+
+
+def build_page(metadata, neuron_idx, split, base_url, similarity_index, class_index, range_index, sketches=None):
+    """NeuronPage for one neuron and split, reading its metadata record once; None if the neuron is unknown"""
+    key = str(neuron_idx)
+    if key not in metadata:
+        return None
+    data = metadata[key]
+    top_images = data.get("top_images", {})
+    images = top_images.get(split, [])
+    train = images if split == "train" else top_images.get("train", [])
+    filenames = tuple(img["filename"] for img in images)
+    activations = tuple(img["activation"] for img in images)
+    train_activations = np.array([img["activation"] for img in train], dtype=np.float64)
+
+    stats = neuron_stats(neuron_idx, split, activations)
+    full_stats = full_distribution_stats(stats, sketches)
+    max_activation = range_index.value(neuron_idx, "max_activation")
+    similar_max = [] if max_activation is None else range_index.nearest(
+        "max_activation", max_activation, PAGE_SIMILAR_MAX, tolerance=SIMILAR_MAX_TOLERANCE, exclude=neuron_idx
+    )
+    return NeuronPage(
+        neuron=int(neuron_idx),
+        split=split,
+        max_activation=float(data.get("max_activation", 0)),
+        mean_activation=float(data.get("mean_activation", 0)),
+        top_image_count=len(train),
+        filenames=filenames,
+        image_urls=image_urls(base_url, int(neuron_idx), filenames),
+        activations=activations,
+        stats=full_stats,
+        full_distribution=full_stats is not stats,
+        classes=tuple(class_index.top_classes(neuron_idx, PAGE_CLASSES)),
+        similar=tuple(similarity_index.most_similar(neuron_idx, PAGE_SIMILAR)),
+        similar_max=tuple(nid for nid, _ in similar_max),
+        distribution=distribution_spec(neuron_idx, train_activations, sketches),
+    )
+
+
+class PageCache:
+    """Thread-safe LRU of (version, neuron, split) -> NeuronPage, shared by all sessions"""
+
+    def __init__(self, max_entries=DEFAULT_CACHE_PAGES):
+        self.max_entries = max_entries
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._pages)
+
+    def get(self, key, build):
+        """The page cached under key, else build() cached under it; concurrent misses may both build"""
+        with self._lock:
+            hit = key in self._pages
+            if hit:
+                self._pages.move_to_end(key)
+                page = self._pages[key]
+        TRACER.cache("neuron_page", hit)
+        if hit:
+            return page
+        page = build()
+        with self._lock:
+            self._pages[key] = page
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_entries:
+                self._pages.popitem(last=False)
+        return page
+
+
+def _padded(rows, dtype, fill, width=None):
+    """(len(rows), width) array of ragged rows padded with fill, and the row lengths"""
+    lengths = np.array([len(row) for row in rows], dtype=np.int32)
+    width = int(lengths.max(initial=0)) if width is None else width
+    if dtype == "S":
+        # Wide enough for the longest string, not numpy's default of one byte
+        dtype = f"S{max((len(value) for row in rows for value in row), default=1)}"
+    out = np.full((len(rows), width), fill, dtype=dtype)
+    for i, row in enumerate(rows):
+        if len(row):
+            out[i, :len(row)] = row
+    return out, lengths
+
+
+class PageTable:
+    """Prebuilt pages of every neuron: one row of arrays per neuron and split, rebuilt into a NeuronPage on lookup"""
+
+    def __init__(self, neuron_ids, splits):
+        self.neuron_ids = np.asarray(neuron_ids)
+        # split -> dict of arrays with one row per neuron, as packed by _pack
+        self.splits = splits
+        self._rows = {int(nid): row for row, nid in enumerate(self.neuron_ids.tolist())}
+
+    @classmethod
+    def build(cls, metadata, splits=None, similarity_index=None, class_index=None, range_index=None, sketches=None,
+              neuron_ids=None):
+        """Pages of `neuron_ids` (default: every neuron) in `splits` (default: all)
+
+        Missing indexes are built from the metadata.
+        """
+        similarity_index = similarity_index or SimilarityIndex.build(metadata)
+        class_index = class_index or ClassHistogramIndex.build(metadata)
+        range_index = range_index or ActivationRangeIndex.build(metadata)
+        if neuron_ids is None:
+            neuron_ids = [int(key) for key in metadata]
+        neuron_ids = np.array([nid for nid in neuron_ids if str(nid) in metadata], dtype=np.int64)
+        packed = {}
+        for split in splits or metadata_splits(metadata):
+            pages = [build_page(metadata, nid, split, "", similarity_index, class_index, range_index, sketches)
+                     for nid in neuron_ids.tolist()]
+            packed[split] = cls._pack(pages)
+        return cls(neuron_ids, packed)
+
+    @staticmethod
+    def _pack(pages):
+        stats = [page.stats for page in pages]
+        has_stats = np.array([s is not None for s in stats])
+
+        def stat(field, dtype=np.float64):
+            return np.array([getattr(s, field) if s is not None else 0 for s in stats], dtype=dtype)
+
+        columns = {
+            "max_activation": np.array([page.max_activation for page in pages]),
+            "mean_activation": np.array([page.mean_activation for page in pages]),
+            "top_image_count": np.array([page.top_image_count for page in pages], dtype=np.int32),
+            "full_distribution": np.array([page.full_distribution for page in pages]),
+            "has_stats": has_stats,
+            "stats_count": stat("count", np.int64),
+            "stats_strong_count": stat("strong_count", np.int64),
+            "stats_percentiles": np.array([[s.percentiles[q] if s is not None else np.nan for q in STAT_PERCENTILES]
+                                           for s in stats]).reshape(len(pages), len(STAT_PERCENTILES)),
+            "stats_heatmap": np.array([s.heatmap if s is not None else np.zeros(HEATMAP_SHAPE) for s in stats]),
+        }
+        for field in ("max", "min", "mean", "selectivity_ratio", "selectivity_percent", "dynamic_range"):
+            columns[f"stats_{field}"] = stat(field)
+        columns["filenames"], columns["n_images"] = _padded(
+            [[name.encode("utf-8") for name in page.filenames] for page in pages], "S", b""
+        )
+        columns["activations"], _ = _padded([page.activations for page in pages], np.float32, np.nan)
+        columns["class_ids"], columns["n_classes"] = _padded(
+            [[wnid.encode("ascii") for wnid, _ in page.classes] for page in pages], "S", b"", PAGE_CLASSES
+        )
+        columns["class_counts"], _ = _padded([[count for _, count in page.classes] for page in pages],
+                                             np.int32, 0, PAGE_CLASSES)
+        columns["similar"], columns["n_similar"] = _padded([[nid for nid, _ in page.similar] for page in pages],
+                                                           np.int32, -1, PAGE_SIMILAR)
+        columns["similar_scores"], _ = _padded([[score for _, score in page.similar] for page in pages],
+                                               np.float32, np.nan, PAGE_SIMILAR)
+        columns["similar_max"], columns["n_similar_max"] = _padded([page.similar_max for page in pages],
+                                                                   np.int32, -1, PAGE_SIMILAR_MAX)
+
+        specs = [page.distribution for page in pages]
+        columns["has_distribution"] = np.array([spec is not None for spec in specs])
+        columns["dist_counts"], columns["dist_bins"] = _padded(
+            [spec["counts"] if spec is not None else [] for spec in specs], np.float64, np.nan
+        )
+        columns["dist_edges"], _ = _padded([spec["edges"] if spec is not None else [] for spec in specs],
+                                           np.float64, np.nan)
+        for field in ("mean", "top_cutoff"):
+            columns[f"dist_{field}"] = np.array([spec[field] if spec is not None else np.nan for spec in specs])
+        columns["dist_top_count"] = np.array([spec["top_count"] if spec is not None else 0 for spec in specs],
+                                             dtype=np.int64)
+        # -1: counted over the top images only
+        columns["dist_images"] = np.array([spec["images"] if spec is not None and spec["images"] is not None
+                                           else -1 for spec in specs], dtype=np.int64)
+        return columns
+
+    def has(self, neuron_idx, split):
+        return split in self.splits and int(neuron_idx) in self._rows
+
+    def page(self, neuron_idx, split, base_url):
+        """NeuronPage of a neuron, with image URLs under base_url; None if the table lacks it"""
+        if not self.has(neuron_idx, split):
+            return None
+        c, row, neuron = self.splits[split], self._rows[int(neuron_idx)], int(neuron_idx)
+        n_images = int(c["n_images"][row])
+        filenames = tuple(name.decode("utf-8") for name in c["filenames"][row, :n_images].tolist())
+        stats = None
+        if c["has_stats"][row]:
+            stats = NeuronStats(
+                neuron=neuron,
+                split=split,
+                count=int(c["stats_count"][row]),
+                max=float(c["stats_max"][row]),
+                min=float(c["stats_min"][row]),
+                mean=float(c["stats_mean"][row]),
+                percentiles=dict(zip(STAT_PERCENTILES, c["stats_percentiles"][row].tolist())),
+                selectivity_ratio=float(c["stats_selectivity_ratio"][row]),
+                strong_count=int(c["stats_strong_count"][row]),
+                selectivity_percent=float(c["stats_selectivity_percent"][row]),
+                dynamic_range=float(c["stats_dynamic_range"][row]),
+                heatmap=c["stats_heatmap"][row],
+            )
+        distribution = None
+        if c["has_distribution"][row]:
+            bins = int(c["dist_bins"][row])
+            images = int(c["dist_images"][row])
+            distribution = {
+                "counts": c["dist_counts"][row, :bins], "edges": c["dist_edges"][row, :bins + 1],
+                "mean": float(c["dist_mean"][row]), "images": images if images >= 0 else None,
+                "top_cutoff": float(c["dist_top_cutoff"][row]), "top_count": int(c["dist_top_count"][row]),
+            }
+        n_classes, n_similar = int(c["n_classes"][row]), int(c["n_similar"][row])
+        return NeuronPage(
+            neuron=neuron,
+            split=split,
+            max_activation=float(c["max_activation"][row]),
+            mean_activation=float(c["mean_activation"][row]),
+            top_image_count=int(c["top_image_count"][row]),
+            filenames=filenames,
+            image_urls=image_urls(base_url, neuron, filenames),
+            activations=tuple(c["activations"][row, :n_images].tolist()),
+            stats=stats,
+            full_distribution=bool(c["full_distribution"][row]),
+            classes=tuple(zip((wnid.decode("ascii") for wnid in c["class_ids"][row, :n_classes].tolist()),
+                              c["class_counts"][row, :n_classes].tolist())),
+            similar=tuple(zip(c["similar"][row, :n_similar].tolist(),
+                              c["similar_scores"][row, :n_similar].tolist())),
+            similar_max=tuple(c["similar_max"][row, :int(c["n_similar_max"][row])].tolist()),
+            distribution=distribution,
+        )
+
+    def save(self, path):
+        arrays = {"neuron_ids": self.neuron_ids, "splits": np.array(list(self.splits))}
+        for split, columns in self.splits.items():
+            for key, array in columns.items():
+                arrays[f"{split}|{key}"] = array
+        save_npz(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            splits = {}
+            for key in data.files:
+                if "|" in key:
+                    split, name = key.split("|")
+                    splits.setdefault(split, {})[name] = data[key]
+            return cls(data["neuron_ids"], {split: splits[split] for split in data["splits"].tolist()})
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python neuron_page.py", description=__doc__.splitlines()[0])
+    parser.add_argument("store_dir", type=Path)
+    parser.add_argument("--splits", help="comma-separated; default: every split in the store")
+    args = parser.parse_args(argv[1:])
+
+    start = time.perf_counter()
+    store = NeuronStore.open(args.store_dir)
+    # Prebuilt indexes in the store are used as they are, so the pages agree with them
+    similarity_index = load_or_build_index(store, None, SIMILARITY_FILENAME, SimilarityIndex, None)
+    class_index = load_or_build_index(store, None, CLASS_INDEX_FILENAME, ClassHistogramIndex, None)
+    sketches_path = store.prebuilt(SKETCHES_FILENAME)
+    sketches = ActivationSketches.load(sketches_path) if sketches_path is not None else None
+    table = PageTable.build(store, splits=args.splits.split(",") if args.splits else None,
+                            similarity_index=similarity_index, class_index=class_index, sketches=sketches)
+    table.save(store.path / PAGES_FILENAME)
+    print(f"Wrote pages of {len(table.neuron_ids)} neurons ({', '.join(table.splits)}) to "
+          f"{store.path / PAGES_FILENAME} in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,307 @@
+"""Sharded neuron metadata for loading on demand over HTTP.
+
+The full `neuron_metadata.json` has to be downloaded and parsed before the
+first neuron can be shown. A sharded copy splits it into a small index plus
+gzipped JSON blocks of `block_size` neurons:
+
+    python neuron_shards.py metadata/neuron_metadata.json shards/ [block_size]
+    python neuron_shards.py store/ shards/ [block_size]
+
+- `index.json`: version, splits, neuron ids, every numeric neuron scalar
+  (`max_activation`, ...), the lucid flag, and the shard list with
+  checksums. The analysis indexes the app needs (`similarity.npz`, ...)
+  are published and listed too: copied from a source store that has them,
+  built from the metadata otherwise.
+- `shard_<n>-<sha>.json.gz`: the JSON entries of one block of neurons. The
+  content hash in the name makes shards immutable, so caches never need to
+  revalidate them.
+
+Published next to the metadata as `metadata/shards/`, the app loads the
+index eagerly and the shards lazily through a bounded LRU (see
+`ShardedMetadata`), so the first render needs one shard, not the dataset.
+That relies on the published indexes. An index missing from the shards
+(e.g. shards written by an older version) is built from every shard
+instead, one pass over all of them per split it reads: building the
+similarity or class index reads the dataset once, global stats four times
+for two splits. Such scans load each shard once, in order, without
+evicting the shards cached for rendering.
+"""
+import gzip
+import hashlib
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import ItemsView, Mapping, ValuesView
+from pathlib import Path
+
+import numpy as np
+
+from instrumentation import TRACER
+from neuron_store import NeuronStore, is_store, source_version
+
+SHARDS_FORMAT = 1
+SHARDS_DIR = "metadata/shards"
+INDEX_FILENAME = "index.json"
+DEFAULT_BLOCK_SIZE = 64
+DEFAULT_MAX_SHARDS = 16
+
+
+def _plain(value):
+    """Copy NeuronRecord-style Mappings into plain dicts and lists for json"""
+    if isinstance(value, Mapping):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_plain(item) for item in value]
+    return value
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def build_shards(metadata, out_dir, version, block_size=DEFAULT_BLOCK_SIZE, prebuilt=()):
+    """Write index.json and the shard files for metadata into out_dir
+
+    `prebuilt` are paths of analysis index files to publish with the shards.
+    Written to a temporary directory first, then moved into place.
+    """
+    out_dir = Path(out_dir)
+    out_dir.parent.mkdir(parents=True, exist_ok=True)
+    keys = sorted(metadata, key=int)
+    tmp_dir = Path(tempfile.mkdtemp(prefix=".shards-", dir=out_dir.parent))
+    try:
+        scalars = {}
+        splits = []
+        has_lucid = []
+        shards = []
+        for first in range(0, len(keys), block_size):
+            block = {key: _plain(metadata[key]) for key in keys[first:first + block_size]}
+            for offset, (key, data) in enumerate(block.items()):
+                row = first + offset
+                has_lucid.append("lucid_image" in data)
+                for split in data.get("top_images", {}):
+                    if split not in splits:
+                        splits.append(split)
+                for field, value in data.items():
+                    if _is_number(value):
+                        scalars.setdefault(field, [None] * len(keys))[row] = value
+
+            payload = gzip.compress(json.dumps(block).encode("utf-8"), mtime=0)
+            sha256 = hashlib.sha256(payload).hexdigest()
+            filename = f"shard_{first // block_size:04d}-{sha256[:12]}.json.gz"
+            (tmp_dir / filename).write_bytes(payload)
+            shards.append({"file": filename, "first": first, "count": len(block), "sha256": sha256})
+
+        indexes = []
+        for path in prebuilt:
+            shutil.copyfile(path, tmp_dir / Path(path).name)
+            indexes.append(Path(path).name)
+
+        index = {
+            "format": SHARDS_FORMAT,
+            "version": version,
+            "block_size": block_size,
+            "splits": splits,
+            "neuron_ids": [int(key) for key in keys],
+            # JSON has no NaN; missing values are null
+            "scalars": {field: [v if v is None or math.isfinite(v) else None for v in values]
+                        for field, values in scalars.items()},
+            "has_lucid": has_lucid,
+            "shards": shards,
+            "indexes": indexes,
+        }
+        with open(tmp_dir / INDEX_FILENAME, "w") as f:
+            json.dump(index, f)
+
+        if out_dir.exists():
+            shutil.rmtree(out_dir)
+        os.replace(tmp_dir, out_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return out_dir
+
+
+def shard_files(index):
+    """Paths, relative to the shards directory, of everything an index refers to"""
+    return [shard["file"] for shard in index["shards"]] + list(index.get("indexes", []))
+
+
+class ShardedMetadata(Mapping):
+    """Dict-compatible view of sharded metadata; shards load on first access
+
+    `fetch(url)` returns an object with `.content` and `.body_path`, like
+    `MetadataCache.fetch`, which is what the app passes in. At most
+    `max_shards` parsed shards are kept in memory.
+    """
+
+    def __init__(self, base_url, index, fetch, max_shards=DEFAULT_MAX_SHARDS):
+        if index.get("format") != SHARDS_FORMAT:
+            raise ValueError(f"Unsupported shards format: {index.get('format')}")
+        self.base_url = base_url.rstrip("/")
+        self.version = index["version"]
+        self.splits = index["splits"]
+        self.block_size = index["block_size"]
+        self.neuron_ids = np.array(index["neuron_ids"], dtype=np.int64)
+        self.has_lucid = np.array(index["has_lucid"], dtype=bool)
+        self._scalars = {
+            field: np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+            for field, values in index["scalars"].items()
+        }
+        self._shards = index["shards"]
+        self._indexes = set(index.get("indexes", []))
+        self._fetch = fetch
+        self._max_shards = max_shards
+        self._keys = [str(nid) for nid in self.neuron_ids.tolist()]
+        self._rows = {key: row for row, key in enumerate(self._keys)}
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, base_url, fetch, max_shards=DEFAULT_MAX_SHARDS):
+        """Fetch base_url/index.json and return the metadata view"""
+        response = fetch(f"{base_url.rstrip('/')}/{INDEX_FILENAME}")
+        return cls(base_url, json.loads(response.content), fetch, max_shards=max_shards)
+
+    def __getitem__(self, key):
+        row = self._rows[key]
+        return self._shard(row // self.block_size)[key]
+
+    def __contains__(self, key):
+        return key in self._rows
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __repr__(self):
+        return f"ShardedMetadata({self.base_url!r}, version={self.version!r}, n_neurons={len(self)})"
+
+    def values(self):
+        return _ScanValues(self)
+
+    def items(self):
+        return _ScanItems(self)
+
+    def _scan(self):
+        """(key, entry) for every neuron in order, loading each shard once
+
+        Full scans (building an index from the metadata) walk the shards in
+        order; going through the LRU would evict and reload them. Shards that
+        are not already cached are parsed for the scan only and not kept.
+        """
+        for i, entry in enumerate(self._shards):
+            with self._lock:
+                shard = self._loaded.get(i)
+            TRACER.cache("metadata_shard", shard is not None)
+            if shard is None:
+                shard = self._load(i)
+            for key in self._keys[entry["first"]:entry["first"] + entry["count"]]:
+                yield key, shard[key]
+
+    def _load(self, i):
+        entry = self._shards[i]
+        with TRACER.span("metadata.shard_load"):
+            payload = self._fetch(f"{self.base_url}/{entry['file']}").content
+            if hashlib.sha256(payload).hexdigest() != entry["sha256"]:
+                raise ValueError(f"Checksum mismatch for shard {entry['file']}")
+            return json.loads(gzip.decompress(payload))
+
+    def _shard(self, i):
+        with self._lock:
+            shard = self._loaded.get(i)
+            if shard is not None:
+                self._loaded.move_to_end(i)
+        TRACER.cache("metadata_shard", shard is not None)
+        if shard is not None:
+            return shard
+        shard = self._load(i)
+        with self._lock:
+            self._loaded[i] = shard
+            while len(self._loaded) > self._max_shards:
+                self._loaded.popitem(last=False)
+        return shard
+
+    def row(self, neuron_idx):
+        """Row of a neuron in the index columns, or None if unknown"""
+        return self._rows.get(str(neuron_idx))
+
+    def scalar(self, field):
+        """Float column for a numeric neuron field, NaN where missing"""
+        return self._scalars[field]
+
+    def prebuilt(self, filename):
+        """Local path of an analysis index published with the shards, or None"""
+        if filename not in self._indexes:
+            return None
+        return Path(self._fetch(f"{self.base_url}/{filename}").body_path)
+
+    @property
+    def loaded_shards(self):
+        return len(self._loaded)
+
+
+class _ScanValues(ValuesView):
+    def __iter__(self):
+        for _, data in self._mapping._scan():
+            yield data
+
+
+class _ScanItems(ItemsView):
+    def __iter__(self):
+        return self._mapping._scan()
+
+
+def _build_missing_indexes(metadata, present, out_dir):
+    """Build the indexes the app needs on first render that are not in `present`; returns their paths
+
+    Without them, the app would build each one from all the shards. The atlas
+    (a t-SNE layout) is left out: the app builds it in the background.
+    """
+    # Imported here: these index modules depend on this one, not the reverse
+    from class_index import CLASS_INDEX_FILENAME, CLASS_SEARCH_FILENAME, ClassHistogramIndex, ClassSearchIndex
+    from global_stats import GLOBAL_STATS_FILENAME, GlobalStats
+    from neuron_analysis import SIMILARITY_FILENAME, SimilarityIndex
+
+    paths = []
+    for filename, index_cls in ((SIMILARITY_FILENAME, SimilarityIndex), (CLASS_INDEX_FILENAME, ClassHistogramIndex),
+                                (CLASS_SEARCH_FILENAME, ClassSearchIndex), (GLOBAL_STATS_FILENAME, GlobalStats)):
+        if filename not in present:
+            index_cls.build(metadata).save(out_dir / filename)
+            paths.append(out_dir / filename)
+    return paths
+
+
+def main(argv):
+    if len(argv) not in (3, 4):
+        print("usage: python neuron_shards.py <neuron_metadata.json|store_dir> <out_dir> [block_size]")
+        return 2
+    source, out_dir = Path(argv[1]), argv[2]
+    block_size = int(argv[3]) if len(argv) == 4 else DEFAULT_BLOCK_SIZE
+    if is_store(source):
+        metadata = NeuronStore.open(source)
+        version = metadata.version
+        prebuilt = sorted(source.glob("*.npz"))
+    else:
+        raw = source.read_bytes()
+        metadata = json.loads(raw)
+        version = source_version(raw)
+        prebuilt = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        prebuilt += _build_missing_indexes(metadata, {path.name for path in prebuilt}, Path(tmp_dir))
+        out = build_shards(metadata, out_dir, version, block_size=block_size, prebuilt=prebuilt)
+    with open(out / INDEX_FILENAME) as f:
+        index = json.load(f)
+    print(f"Wrote {len(index['shards'])} shards of up to {block_size} neurons to {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
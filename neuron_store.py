@@ -0,0 +1,381 @@
+"""Columnar, memory-mapped store for the neuron metadata.
+
+`neuron_metadata.json` parses into one Python dict per top image, which costs
+every Streamlit worker hundreds of MB. This module turns it into plain `.npy`
+files once:
+
+    python neuron_store.py metadata/neuron_metadata.json store/
+
+- `neuron_ids.npy` plus one float column per numeric neuron scalar
+  (`scalar_max_activation.npy`, ...)
+- `activations_<split>.npy`: `(n_neurons, k)` float32, NaN padded
+- `filename_idx_<split>.npy` / `path_idx_<split>.npy`: `(n_neurons, k)` int32
+  indices into the interned `filenames` / `paths` string tables
+- `manifest.json` with the version, splits and the remaining
+  non-numeric neuron fields
+
+`NeuronStore.open()` memory-maps the arrays, so all workers on a host share
+a single copy through the page cache. The store behaves like the parsed JSON:
+`store["89"]["top_images"]["train"][0]["activation"]` works unchanged. It also
+gives column access (`activations()`, `scalar()`, ...) for vectorized code.
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+from collections.abc import Mapping
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+STORE_FORMAT = 1
+MANIFEST_NAME = "manifest.json"
+
+
+def source_version(raw_bytes):
+    """Short content hash used to version a store built from raw metadata"""
+    return hashlib.sha256(raw_bytes).hexdigest()[:16]
+
+
+def is_store(path):
+    return (Path(path) / MANIFEST_NAME).is_file()
+
+
+def save_npz(path, **arrays):
+    """Atomically write arrays to path as an npz file
+
+    Each call writes its own temporary file, so processes sharing a cache
+    directory can save the same index at once; the last rename wins.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".npz", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class _StringTable:
+    """Interns strings into a utf-8 blob plus an offsets array"""
+
+    def __init__(self):
+        self._index = {}
+        self._encoded = []
+
+    def add(self, value):
+        idx = self._index.get(value)
+        if idx is None:
+            idx = len(self._encoded)
+            self._index[value] = idx
+            self._encoded.append(value.encode("utf-8"))
+        return idx
+
+    def save(self, out_dir, name):
+        lengths = np.fromiter((len(s) for s in self._encoded), dtype=np.int64, count=len(self._encoded))
+        offsets = np.zeros(len(self._encoded) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        blob = np.frombuffer(b"".join(self._encoded), dtype=np.uint8)
+        np.save(out_dir / f"{name}_blob.npy", blob)
+        np.save(out_dir / f"{name}_offsets.npy", offsets)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def build_store(metadata, out_dir, version=None):
+    """Write the columnar store for a parsed `neuron_metadata.json` dict"""
+    out_dir = Path(out_dir)
+    neuron_keys = list(metadata.keys())
+    n = len(neuron_keys)
+
+    # Splits in first-seen order, with the widest top-k per split
+    split_k = {}
+    for key in neuron_keys:
+        for split, images in metadata[key].get("top_images", {}).items():
+            split_k[split] = max(split_k.get(split, 0), len(images))
+
+    # Numeric neuron fields become columns, everything else stays in the manifest
+    scalar_kinds = {}
+    for key in neuron_keys:
+        for field, value in metadata[key].items():
+            if field == "top_images":
+                continue
+            if _is_number(value) and scalar_kinds.get(field, "int") != "other":
+                if isinstance(value, float) or scalar_kinds.get(field) == "float":
+                    scalar_kinds[field] = "float"
+                else:
+                    scalar_kinds[field] = "int"
+            else:
+                scalar_kinds[field] = "other"
+    columns = {field: kind for field, kind in scalar_kinds.items() if kind != "other"}
+
+    out_dir.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(prefix=".store-", dir=out_dir.parent))
+    try:
+        filenames = _StringTable()
+        paths = _StringTable()
+        extras = {}
+
+        neuron_ids = np.array([int(key) for key in neuron_keys], dtype=np.int32)
+        has_top_images = np.zeros(n, dtype=bool)
+        has_lucid = np.zeros(n, dtype=bool)
+        scalar_arrays = {field: np.full(n, np.nan, dtype=np.float64) for field in columns}
+        split_arrays = {
+            split: (
+                np.full((n, k), np.nan, dtype=np.float32),
+                np.full((n, k), -1, dtype=np.int32),
+                np.full((n, k), -1, dtype=np.int32),
+                np.full(n, -1, dtype=np.int32),
+            )
+            for split, k in split_k.items()
+        }
+
+        for row, key in enumerate(neuron_keys):
+            neuron_data = metadata[key]
+            has_lucid[row] = "lucid_image" in neuron_data
+            for field, value in neuron_data.items():
+                if field == "top_images":
+                    continue
+                if field in columns:
+                    scalar_arrays[field][row] = value
+                else:
+                    extras.setdefault(key, {})[field] = value
+
+            if "top_images" not in neuron_data:
+                continue
+            has_top_images[row] = True
+            for split, images in neuron_data["top_images"].items():
+                activations, filename_idx, path_idx, counts = split_arrays[split]
+                counts[row] = len(images)
+                for i, img in enumerate(images):
+                    activations[row, i] = img["activation"]
+                    filename_idx[row, i] = filenames.add(img["filename"])
+                    path_idx[row, i] = paths.add(img.get("original_path", ""))
+
+        np.save(tmp_dir / "neuron_ids.npy", neuron_ids)
+        np.save(tmp_dir / "has_top_images.npy", has_top_images)
+        np.save(tmp_dir / "has_lucid.npy", has_lucid)
+        for field, values in scalar_arrays.items():
+            np.save(tmp_dir / f"scalar_{field}.npy", values)
+        for split, (activations, filename_idx, path_idx, counts) in split_arrays.items():
+            np.save(tmp_dir / f"activations_{split}.npy", activations)
+            np.save(tmp_dir / f"filename_idx_{split}.npy", filename_idx)
+            np.save(tmp_dir / f"path_idx_{split}.npy", path_idx)
+            np.save(tmp_dir / f"counts_{split}.npy", counts)
+        filenames.save(tmp_dir, "filenames")
+        paths.save(tmp_dir, "paths")
+
+        manifest = {
+            "format": STORE_FORMAT,
+            "version": version,
+            "n_neurons": n,
+            "splits": list(split_k.keys()),
+            "top_k": split_k,
+            "scalars": columns,
+            "extras": extras,
+        }
+        # The manifest goes last: a directory without one is never opened
+        with open(tmp_dir / MANIFEST_NAME, "w") as f:
+            json.dump(manifest, f)
+
+        if out_dir.exists():
+            shutil.rmtree(out_dir)
+        os.replace(tmp_dir, out_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return out_dir
+
+
+class NeuronStore(Mapping):
+    """Read-only, dict-compatible view over a columnar neuron store"""
+
+    def __init__(self, path, mmap_mode="r"):
+        self.path = Path(path)
+        with open(self.path / MANIFEST_NAME) as f:
+            manifest = json.load(f)
+        if manifest.get("format") != STORE_FORMAT:
+            raise ValueError(f"Unsupported store format: {manifest.get('format')}")
+
+        def load(name):
+            return np.load(self.path / f"{name}.npy", mmap_mode=mmap_mode)
+
+        self.version = manifest.get("version")
+        self.splits = manifest["splits"]
+        self.top_k = manifest["top_k"]
+        self._scalar_kinds = manifest["scalars"]
+        self._extras = manifest["extras"]
+
+        self.neuron_ids = load("neuron_ids")
+        self.has_top_images = load("has_top_images")
+        self.has_lucid = load("has_lucid")
+        self._scalars = {field: load(f"scalar_{field}") for field in self._scalar_kinds}
+        self._activations = {split: load(f"activations_{split}") for split in self.splits}
+        self._filename_idx = {split: load(f"filename_idx_{split}") for split in self.splits}
+        self._path_idx = {split: load(f"path_idx_{split}") for split in self.splits}
+        self._counts = {split: load(f"counts_{split}") for split in self.splits}
+        self._filenames = (load("filenames_blob"), load("filenames_offsets"))
+        self._paths = (load("paths_blob"), load("paths_offsets"))
+
+        self._keys = [str(nid) for nid in self.neuron_ids.tolist()]
+        self._rows = {key: row for row, key in enumerate(self._keys)}
+        self._record = lru_cache(maxsize=256)(self._make_record)
+
+    @classmethod
+    def open(cls, path, mmap_mode="r"):
+        return cls(path, mmap_mode=mmap_mode)
+
+    # Mapping interface, keyed like the JSON (string neuron ids)
+    def __getitem__(self, key):
+        return self._record(self._rows[key])
+
+    def __contains__(self, key):
+        return key in self._rows
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __repr__(self):
+        return f"NeuronStore({str(self.path)!r}, version={self.version!r}, n_neurons={len(self)})"
+
+    # Column access
+    def row(self, neuron_idx):
+        """Row of a neuron in the column arrays, or None if unknown"""
+        return self._rows.get(str(neuron_idx))
+
+    def activations(self, split):
+        """(n_neurons, k) float32 activations, NaN past each neuron's count"""
+        return self._activations[split]
+
+    def counts(self, split):
+        """Number of top images per neuron, -1 where the split is missing"""
+        return self._counts[split]
+
+    def scalar(self, field):
+        """Float column for a numeric neuron field, NaN where missing"""
+        return self._scalars[field]
+
+    def filename(self, split, row, i):
+        return self._decode(self._filenames, self._filename_idx[split][row, i])
+
+    def original_path(self, split, row, i):
+        return self._decode(self._paths, self._path_idx[split][row, i])
+
+    def filenames(self, split, row):
+        count = max(int(self._counts[split][row]), 0)
+        return [self._decode(self._filenames, idx) for idx in self._filename_idx[split][row, :count]]
+
+    def original_paths(self, split, row):
+        count = max(int(self._counts[split][row]), 0)
+        return [self._decode(self._paths, idx) for idx in self._path_idx[split][row, :count]]
+
+    def prebuilt(self, filename):
+        """Path of an analysis index prebuilt into the store directory, or None"""
+        path = self.path / filename
+        return path if path.exists() else None
+
+    def path_indices(self, split):
+        """(n_neurons, k) int32 indices into path_table(), -1 past each count"""
+        return self._path_idx[split]
+
+    def path_table(self):
+        """Every interned original_path, in index order"""
+        blob, offsets = self._paths
+        data = bytes(blob)
+        return [data[start:end].decode("utf-8") for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+    @staticmethod
+    def _decode(table, idx):
+        blob, offsets = table
+        return bytes(blob[offsets[idx]:offsets[idx + 1]]).decode("utf-8")
+
+    def _make_record(self, row):
+        return NeuronRecord(self, row)
+
+
+class NeuronRecord(Mapping):
+    """One neuron of a NeuronStore, shaped like its JSON entry"""
+
+    def __init__(self, store, row):
+        self._store = store
+        self._row = row
+        self._fields = {}
+        for field, kind in store._scalar_kinds.items():
+            value = store._scalars[field][row]
+            if not np.isnan(value):
+                self._fields[field] = int(value) if kind == "int" else float(value)
+        self._fields.update(store._extras.get(store._keys[row], {}))
+        self._top_images = _TopImages(store, row) if store.has_top_images[row] else None
+
+    def __getitem__(self, key):
+        if key == "top_images" and self._top_images is not None:
+            return self._top_images
+        return self._fields[key]
+
+    def __iter__(self):
+        yield from self._fields
+        if self._top_images is not None:
+            yield "top_images"
+
+    def __len__(self):
+        return len(self._fields) + (self._top_images is not None)
+
+
+class _TopImages(Mapping):
+    """Split -> list of top image dicts, materialized on first access"""
+
+    def __init__(self, store, row):
+        self._store = store
+        self._row = row
+        self._splits = [split for split in store.splits if store._counts[split][row] >= 0]
+        self._lists = {}
+
+    def __getitem__(self, split):
+        if split not in self._splits:
+            raise KeyError(split)
+        images = self._lists.get(split)
+        if images is None:
+            store, row = self._store, self._row
+            count = int(store._counts[split][row])
+            activations = store._activations[split][row, :count].tolist()
+            images = [
+                {"filename": filename, "activation": activation, "original_path": path}
+                for filename, activation, path in zip(
+                    store.filenames(split, row), activations, store.original_paths(split, row)
+                )
+            ]
+            self._lists[split] = images
+        return images
+
+    def __iter__(self):
+        return iter(self._splits)
+
+    def __len__(self):
+        return len(self._splits)
+
+
+def main(argv):
+    if len(argv) != 3:
+        print("usage: python neuron_store.py <neuron_metadata.json> <out_dir>")
+        return 2
+    raw = Path(argv[1]).read_bytes()
+    version = source_version(raw)
+    out_dir = build_store(json.loads(raw), argv[2], version=version)
+    store = NeuronStore.open(out_dir)
+    print(f"Built {store!r}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,31 @@
+"""Neurons the app suggests: the default one and the notable ones in the sidebar.
+
+Shared by the app and warmup.py, which warms exactly these.
+"""
+
+# Neuron shown when no ?neuron= is given
+DEFAULT_NEURON = 1
+
+# Notable neurons offered in the sidebar, grouped by theme
+SUGGESTION_CATEGORIES = {
+    "People & Characters": {
+        "Donald Trump": 89, "Spider-Man": 244, "Elvis": 1063,
+        "Hillary Clinton": 1165, "Superman": 2065
+    },
+    "Animals": {
+        "Puppies": 355, "Frog": 1040, "Turtle": 978,
+        "Dalmatian": 1131, "Horse": 1406, "Lion": 1428
+    },
+    "Nature": {
+        "Flowers": 306, "Rose": 514, "Wheat": 4,
+        "Banana": 625, "Droplets": 967
+    },
+    "Human Features": {
+        "Smile": 432, "Beard": 1039, "Curly Hair": 1069,
+        "Sunglasses": 1095, "Raised Hand": 1116
+    },
+    "Text & Symbols": {
+        "Letter E": 1434, "Star Symbol": 1393,
+        "Google Logo": 1418, "Nike": 1104
+    }
+}
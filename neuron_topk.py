@@ -0,0 +1,264 @@
+"""Neuron metadata from raw activation matrices, in bounded memory.
+
+Produces `neuron_metadata.json` for a new layer or checkpoint straight from
+the model's activations, without loading them into RAM. The input is one
+directory per split, each holding an `(n_images x n_neurons)` matrix cut
+into row chunks:
+
+    activations/
+      train/
+        images.txt    original path of every image row, in row order
+                      ("n01440764/n01440764_11433.JPEG")
+        000.npy       (rows, n_neurons) activations; chunks are read in name order
+        001.npy
+        ...
+      val/
+        ...
+
+    python neuron_topk.py activations/ out/ [--top-k 100] [--workers 4] [--chunk-rows 4096] [--store]
+
+This writes `out/metadata/neuron_metadata.json` and `dataset_summary.json`
+in the schema the app loads. It also writes `activation_sketches.npz`, the
+full activation distribution of every neuron (see activation_sketch.py).
+With `--store` it adds a columnar store in `out/store/` (see
+neuron_store.py) that includes the sketches. The files are memory-mapped and cut into
+blocks of `chunk_rows` rows. A process pool finds each block's top-k per
+neuron with `argpartition` and sketches the block. The parent merges the
+block results into a running top-k and sketch as they arrive. Peak memory is about `workers * chunk_rows *
+n_neurons` activations for the blocks in flight, plus `2 * top_k *
+n_neurons` for the running result, however many images there are.
+`images.txt` is only read at the end, for the rows that made a top-k.
+
+As in the published dataset, `max_activation` and `mean_activation` are the
+max and mean of each neuron's top-k activations in the first split. Image
+filenames follow the published `<split>_rank_<rank>.jpg` layout; exporting
+the image crops themselves is left to the script that renders them.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import numpy as np
+
+from activation_sketch import SKETCHES_FILENAME, ActivationSketches, QuantileSketch
+from neuron_store import build_store, source_version
+
+DEFAULT_TOP_K = 100
+DEFAULT_CHUNK_ROWS = 4096
+IMAGES_FILENAME = "images.txt"
+
+
+def chunk_files(split_dir):
+    """Activation chunks of one split, in row order"""
+    return sorted(Path(split_dir).glob("*.npy"))
+
+
+def plan_blocks(files, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """([(path, start, stop, first global row), ...], n_images, n_neurons) for the chunks of one split"""
+    blocks, n_images, n_neurons = [], 0, None
+    for path in files:
+        shape = np.load(path, mmap_mode="r").shape
+        if len(shape) != 2:
+            raise ValueError(f"{path}: expected a 2-D (images x neurons) array, got shape {shape}")
+        if n_neurons is None:
+            n_neurons = shape[1]
+        elif shape[1] != n_neurons:
+            raise ValueError(f"{path}: {shape[1]} neurons, but earlier chunks have {n_neurons}")
+        for start in range(0, shape[0], chunk_rows):
+            stop = min(start + chunk_rows, shape[0])
+            blocks.append((str(path), start, stop, n_images + start))
+        n_images += shape[0]
+    return blocks, n_images, n_neurons or 0
+
+
+def _top_k_rows(values, k):
+    """Row positions of the k largest values in each column, unordered"""
+    if k >= len(values):
+        return np.broadcast_to(np.arange(len(values))[:, None], values.shape)
+    return np.argpartition(values, len(values) - k, axis=0)[len(values) - k:]
+
+
+def scan_block(path, start, stop, first_row, k, threshold=None):
+    """(values, global rows), both (at most k, n_neurons), of one block's top-k per neuron, and its QuantileSketch
+
+    Runs in the worker processes; each one maps the chunk itself, so only the
+    small result crosses the process boundary. Values not above `threshold`
+    (the running k-th best of each neuron) can never make the top-k. Once
+    the running top-k has filled up, that is nearly all of them, so the few
+    that are left are gathered directly instead of partitioning the block;
+    missing slots are -inf with row -1.
+    """
+    values = np.array(np.load(path, mmap_mode="r")[start:stop], dtype=np.float32)
+    # NaN never makes a top-k
+    nan = np.isnan(values)
+    if nan.any():
+        values[nan] = -np.inf
+    sketch = QuantileSketch(values.shape[1], seed=first_row)
+    sketch.add(values, first_row)
+    if threshold is not None:
+        # Flat indices of the candidates are far cheaper to find than 2-D ones
+        rows, columns = np.divmod(np.flatnonzero(values > threshold), values.shape[1])
+        counts = np.bincount(columns, minlength=values.shape[1])
+        if counts.max(initial=0) <= k:
+            width = int(counts.max(initial=0))
+            order = np.argsort(columns, kind="stable")
+            rows, columns = rows[order], columns[order]
+            slots = np.arange(len(columns)) - np.repeat(np.cumsum(counts) - counts, counts)
+            top_values = np.full((width, values.shape[1]), -np.inf, dtype=np.float32)
+            top_rows = np.full((width, values.shape[1]), -1, dtype=np.int64)
+            top_values[slots, columns] = values[rows, columns]
+            top_rows[slots, columns] = rows + first_row
+            return top_values, top_rows, sketch
+    rows = _top_k_rows(values, k)
+    return np.take_along_axis(values, rows, axis=0), rows + first_row, sketch
+
+
+def merge_top_k(values, rows, new_values, new_rows, k):
+    """Running top-k merged with a block's; either may be None"""
+    if values is None:
+        return new_values, new_rows
+    values, rows = np.concatenate([values, new_values]), np.concatenate([rows, new_rows])
+    keep = _top_k_rows(values, k)
+    return np.take_along_axis(values, keep, axis=0), np.take_along_axis(rows, keep, axis=0)
+
+
+def _threshold(values, k):
+    """Each neuron's k-th best activation so far, or None until k have been seen"""
+    if values is None or len(values) < k:
+        return None
+    return values.min(axis=0)
+
+
+def scan_split(split_dir, k=DEFAULT_TOP_K, workers=os.cpu_count(), chunk_rows=DEFAULT_CHUNK_ROWS):
+    """(values, rows, n_images, sketch): top-k activations per neuron of one split, and their full distribution
+
+    `values` and `rows` are (min(k, n_images), n_neurons), sorted by
+    activation, highest first. Which of several equal activations at the
+    cut make it in is unspecified. `workers=0` runs in process.
+    """
+    blocks, n_images, n_neurons = plan_blocks(chunk_files(split_dir), chunk_rows)
+    values = rows = None
+    sketch = QuantileSketch(n_neurons)
+
+    def merge(block_values, block_rows, block_sketch):
+        nonlocal values, rows
+        values, rows = merge_top_k(values, rows, block_values, block_rows, k)
+        sketch.merge(block_sketch)
+
+    if workers:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Two blocks in flight per worker bounds the memory held by finished results
+            pending = set()
+            for block in blocks:
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        merge(*future.result())
+                pending.add(pool.submit(scan_block, *block, k, _threshold(values, k)))
+            for future in pending:
+                merge(*future.result())
+    else:
+        for block in blocks:
+            merge(*scan_block(*block, k, _threshold(values, k)))
+
+    sketch.compress()
+    if values is None:
+        return (np.zeros((0, n_neurons), dtype=np.float32), np.zeros((0, n_neurons), dtype=np.int64), n_images,
+                sketch)
+    order = np.lexsort((rows, -values), axis=0)
+    return (np.take_along_axis(values, order, axis=0), np.take_along_axis(rows, order, axis=0), n_images,
+            sketch)
+
+
+def read_image_paths(images_file, rows):
+    """{row: original path} for the given rows, streamed from images.txt"""
+    wanted = np.unique(rows)
+    paths = {}
+    i = 0
+    with open(images_file, encoding="utf-8") as f:
+        for row, line in enumerate(f):
+            if i == len(wanted):
+                break
+            if row == wanted[i]:
+                paths[row] = line.rstrip("\n")
+                i += 1
+    if i < len(wanted):
+        raise ValueError(f"{images_file} has fewer lines than the activation chunks have rows")
+    return paths
+
+
+def split_names(activations_dir):
+    """Split subdirectories with activation chunks, "train" first"""
+    splits = sorted(path.name for path in Path(activations_dir).iterdir() if path.is_dir() and chunk_files(path))
+    return sorted(splits, key=lambda split: split != "train")
+
+
+def build_metadata(activations_dir, top_k=DEFAULT_TOP_K, workers=os.cpu_count(), chunk_rows=DEFAULT_CHUNK_ROWS,
+                   splits=None):
+    """(metadata dict in the neuron_metadata.json schema, dataset summary dict, ActivationSketches)"""
+    activations_dir = Path(activations_dir)
+    splits = splits or split_names(activations_dir)
+    metadata, summary_splits, sketches = {}, {}, {}
+    for split in splits:
+        values, rows, n_images, sketches[split] = scan_split(activations_dir / split, top_k, workers, chunk_rows)
+        paths = read_image_paths(activations_dir / split / IMAGES_FILENAME, rows[values != -np.inf])
+        summary_splits[split] = {"total_images": n_images}
+        for neuron in range(values.shape[1]):
+            images = [
+                {"filename": f"{split}_rank_{rank:03d}.jpg", "activation": float(value),
+                 "original_path": paths[row]}
+                for rank, (value, row) in enumerate(zip(values[:, neuron].tolist(), rows[:, neuron].tolist()))
+                if value != -np.inf
+            ]
+            data = metadata.setdefault(str(neuron), {})
+            if split == splits[0] and images:
+                data["max_activation"] = images[0]["activation"]
+                data["mean_activation"] = float(np.mean([img["activation"] for img in images]))
+            data.setdefault("top_images", {})[split] = images
+    summary = {"dataset_info": {"total_neurons": len(metadata)}, "splits": summary_splits}
+    neuron_ids = np.array([int(key) for key in metadata], dtype=np.int64)
+    return metadata, summary, ActivationSketches.from_sketches(neuron_ids, sketches)
+
+
+def _write_json(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    raw = json.dumps(data).encode("utf-8")
+    tmp_path.write_bytes(raw)
+    os.replace(tmp_path, path)
+    return raw
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python neuron_topk.py", description=__doc__.splitlines()[0])
+    parser.add_argument("activations_dir", type=Path)
+    parser.add_argument("out_dir", type=Path)
+    parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="0 runs in process")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument("--splits", help="comma-separated; default: every split directory, train first")
+    parser.add_argument("--store", action="store_true", help="also build the columnar store in out_dir/store")
+    args = parser.parse_args(argv[1:])
+
+    start = time.perf_counter()
+    metadata, summary, sketches = build_metadata(args.activations_dir, args.top_k, args.workers, args.chunk_rows,
+                                       splits=args.splits.split(",") if args.splits else None)
+    raw = _write_json(args.out_dir / "metadata" / "neuron_metadata.json", metadata)
+    _write_json(args.out_dir / "metadata" / "dataset_summary.json", summary)
+    sketches.save(args.out_dir / "metadata" / SKETCHES_FILENAME)
+    images = ", ".join(f"{split['total_images']} {name}" for name, split in summary["splits"].items())
+    print(f"Wrote top-{args.top_k} images of {len(metadata)} neurons ({images} images) "
+          f"in {time.perf_counter() - start:.1f}s")
+    if args.store:
+        store_dir = build_store(metadata, args.out_dir / "store", version=source_version(raw))
+        sketches.save(store_dir / SKETCHES_FILENAME)
+        print(f"Built {store_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,204 @@
+"""Background prefetching of the images a user is likely to open next.
+
+While a neuron is on screen, a small shared thread pool pulls its
+neighbours' lucid images and top-activation thumbnails into the
+`ImageCache`. When the user moves on, the rest of the old batch is dropped.
+Each owner (one browser session) has at most one live batch. The pool size
+bounds concurrency across all sessions, each batch stops once it has
+downloaded its byte budget, and all batches together stop once the process
+has prefetched its byte budget for the current window. Jobs that do not
+fit in the bounded queue are dropped.
+"""
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+DEFAULT_WORKERS = 4
+DEFAULT_BATCH_BYTES = 64 * 1024 * 1024
+DEFAULT_WINDOW_BYTES = 256 * 1024 * 1024
+DEFAULT_WINDOW_SECONDS = 60
+DEFAULT_QUEUE_SIZE = 1024
+
+log = logging.getLogger(__name__)
+
+
+class PrefetchBatch:
+    """Jobs scheduled for one owner by one navigation"""
+
+    def __init__(self, key, byte_budget):
+        self.key = key
+        self.byte_budget = byte_budget
+        self.bytes_fetched = 0
+        self.fetched = 0
+        self.skipped = 0
+        self.pending = 0
+        self.error = None
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def exhausted(self):
+        return self.bytes_fetched >= self.byte_budget
+
+    @property
+    def done(self):
+        return self.pending == 0
+
+
+class Prefetcher:
+    """Bounded, cancellable background warmer for an ImageCache
+
+    Workers are daemon threads so queued prefetches never hold up shutdown;
+    cancelled jobs are dropped as they reach the front of the queue.
+    `window_bytes` caps what all batches together download per
+    `window_seconds`, however many sessions are navigating.
+    """
+
+    def __init__(self, image_cache, max_workers=DEFAULT_WORKERS, batch_bytes=DEFAULT_BATCH_BYTES,
+                 window_bytes=DEFAULT_WINDOW_BYTES, window_seconds=DEFAULT_WINDOW_SECONDS,
+                 queue_size=DEFAULT_QUEUE_SIZE):
+        self.image_cache = image_cache
+        self.batch_bytes = batch_bytes
+        self.window_bytes = window_bytes
+        self.window_seconds = window_seconds
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._batches = {}
+        # (time, bytes) of recent fetches by any batch, oldest first
+        self._window = deque()
+        self._window_total = 0
+        self._workers = [
+            threading.Thread(target=self._work, name=f"prefetch-{i}", daemon=True)
+            for i in range(max_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def schedule(self, owner, key, plan):
+        """Replace owner's batch with the jobs `plan()` yields, in priority order
+
+        Jobs are (url, size): `size` is a (width, height) box for a resized
+        copy, or None for the original. Does nothing if owner's live batch
+        already has this key, so calling it on every rerun is cheap. `plan`
+        runs on a background thread, because listing the jobs may itself
+        need metadata that is not loaded yet.
+        """
+        with self._lock:
+            current = self._batches.get(owner)
+            if current is not None and current.key == key and not current.cancelled:
+                return current
+            if current is not None:
+                current.cancel()
+            # Forget finished batches of sessions that went away
+            for other in [o for o, b in self._batches.items() if o != owner and b.done]:
+                del self._batches[other]
+            batch = PrefetchBatch(key, self.batch_bytes)
+            # Held until planning finishes, so the batch is not done while it is still being listed
+            batch.pending += 1
+            self._batches[owner] = batch
+        threading.Thread(target=self._plan, args=(batch, plan), name="prefetch-plan", daemon=True).start()
+        return batch
+
+    def _plan(self, batch, plan):
+        seen = set()
+        try:
+            for url, size in plan():
+                if batch.cancelled:
+                    break
+                if (url, size) in seen:
+                    continue
+                seen.add((url, size))
+                if self.image_cache.is_cached(url, size) or self.image_cache.recently_failed(url):
+                    continue
+                with self._lock:
+                    batch.pending += 1
+                try:
+                    self._queue.put_nowait((batch, url, size))
+                except queue.Full:
+                    # Workers are behind; drop the rest of this plan rather than pile up
+                    with self._lock:
+                        batch.pending -= 1
+                        batch.skipped += 1
+                    break
+        except Exception as e:
+            batch.error = e
+            log.warning("Planning prefetch batch %r failed", batch.key, exc_info=True)
+        finally:
+            with self._lock:
+                batch.pending -= 1
+
+    def cancel(self, owner):
+        with self._lock:
+            batch = self._batches.pop(owner, None)
+        if batch is not None:
+            batch.cancel()
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            batch, url, size = job
+            try:
+                fetched, downloaded = self._fetch(batch, url, size)
+            except Exception:
+                fetched, downloaded = False, 0
+            with self._lock:
+                batch.pending -= 1
+                if fetched:
+                    batch.fetched += 1
+                else:
+                    batch.skipped += 1
+                # Failed downloads still cost their bytes
+                if downloaded:
+                    batch.bytes_fetched += downloaded
+                    self._window.append((time.monotonic(), downloaded))
+                    self._window_total += downloaded
+
+    def window_bytes_fetched(self):
+        """Bytes prefetched by all batches within the last window_seconds"""
+        cutoff = time.monotonic() - self.window_seconds
+        with self._lock:
+            while self._window and self._window[0][0] < cutoff:
+                self._window_total -= self._window.popleft()[1]
+            return self._window_total
+
+    @property
+    def over_budget(self):
+        return self.window_bytes_fetched() >= self.window_bytes
+
+    def _fetch(self, batch, url, size):
+        """(whether the job was cached, bytes downloaded from the network for it)"""
+        # Re-checked here: the user may have moved on, or a foreground request fetched it
+        if batch.cancelled or batch.exhausted or self.over_budget or self.image_cache.is_cached(url, size):
+            return False, 0
+        if size is None:
+            path, downloaded = self.image_cache.fetch_original(url)
+        else:
+            path, downloaded = self.image_cache.fetch_resized(url, size)
+        return path is not None, downloaded
+
+    def stats(self):
+        """{owner: (key, fetched, skipped, pending, bytes_fetched, error)} for live batches"""
+        with self._lock:
+            return {
+                owner: (batch.key, batch.fetched, batch.skipped, batch.pending, batch.bytes_fetched, batch.error)
+                for owner, batch in self._batches.items()
+            }
+
+    def shutdown(self):
+        with self._lock:
+            batches, self._batches = list(self._batches.values()), {}
+        for batch in batches:
+            batch.cancel()
+        for _ in self._workers:
+            # Blocks if the queue is full; cancelled jobs drain quickly
+            self._queue.put(None)
@@ -0,0 +1,43 @@
+"""Regression tests for ClassSearchIndex, on a small hand-built metadata dict"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from class_index import ClassSearchIndex  # noqa: E402
+
+# Two ImageNet classes are both named "crane": the bird and the machine
+CRANE_BIRD = "n02012849"
+CRANE_MACHINE = "n03126707"
+
+
+def _metadata():
+    def image(wnid, activation):
+        return {"filename": f"{wnid}.jpg", "activation": activation, "original_path": f"{wnid}/{wnid}_1.JPEG"}
+
+    return {
+        "0": {"max_activation": 2.0, "mean_activation": 1.5,
+              "top_images": {"train": [image(CRANE_BIRD, 2.0), image(CRANE_MACHINE, 1.0)]}},
+        "1": {"max_activation": 3.0, "mean_activation": 3.0,
+              "top_images": {"train": [image(CRANE_MACHINE, 3.0)]}},
+    }
+
+
+def test_exact_name_shared_by_two_classes():
+    index = ClassSearchIndex.build(_metadata())
+    assert sorted(wnid for wnid, _, _ in index.search("crane")) == [CRANE_BIRD, CRANE_MACHINE]
+
+
+def test_misspelled_name_shared_by_two_classes():
+    index = ClassSearchIndex.build(_metadata())
+    results = index.search("cranee")
+    assert sorted(wnid for wnid, _, _ in results) == [CRANE_BIRD, CRANE_MACHINE]
+    assert dict((wnid, [nid for nid, _, _ in neurons]) for wnid, _, neurons in results) == {
+        CRANE_BIRD: [0],
+        CRANE_MACHINE: [1, 0],
+    }
+
+
+def test_misspelled_name_without_images_still_matches_every_class():
+    index = ClassSearchIndex.build(_metadata())
+    assert len({wnid for wnid, _, _ in index.search("maillott")}) == 2
@@ -0,0 +1,277 @@
+"""Background warm-up of the caches the app shares, with a readiness endpoint.
+
+After a deploy, the first visitor pays every cold cost. The metadata is
+downloaded and its store built, then the analysis indexes are built. Then
+the images of the default neuron are fetched, and the images of whichever
+notable neurons they click in the sidebar. Streamlit only runs the app when
+a session connects, so the app cannot do any of this at process start.
+warmup.py runs next to it, from the same settings (CLIP_MICROSCOPE_DATA,
+CLIP_MICROSCOPE_STORE, CLIP_MICROSCOPE_CACHE_DIR, ...):
+
+    python warmup.py [--port 8502] [--top 50] [--images 20]   # warm in the background, serve /ready
+    python warmup.py --once                                     # warm, then exit (1 if it failed)
+
+It fills the on-disk caches the app reads, in four steps:
+
+1. metadata: fetched into the HTTP cache, and its store built;
+2. indexes: similarity, ImageNet classes, class search and global stats,
+   cached per metadata version, plus the published activation sketches;
+3. pages: `neuron_pages.npz` with the pages (see neuron_page.py) of the warm
+   neurons, which the app uses unless the dataset publishes a full one;
+4. images: the lucid image and top-image thumbnails of each warm neuron.
+
+The warm neurons are the default one, the notable neurons of the sidebar and
+the `--top` neurons with the highest max activation. `GET /ready` answers
+200 once all four steps are done and 503 until then, with a JSON progress
+report either way, so a load balancer can hold traffic until the pod is
+warm. The neuron atlas (a t-SNE layout, tens of seconds) is laid out after
+that, without holding up readiness.
+"""
+import argparse
+import http.server
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+from activation_sketch import SKETCHES_FILENAME, ActivationSketches
+from class_index import CLASS_INDEX_FILENAME, CLASS_SEARCH_FILENAME, ClassHistogramIndex, ClassSearchIndex
+from dataset_layout import HF_BASE_URL, lucid_image_path
+from global_stats import GLOBAL_STATS_FILENAME, GlobalStats, metadata_splits
+from image_cache import ImageCache
+from lucid_cache import LucidCache, lucid_listing
+from metadata_cache import MetadataCache, as_base_url
+from neuron_analysis import SIMILARITY_FILENAME, ActivationRangeIndex, SimilarityIndex
+from neuron_atlas import ATLAS_FILENAME, NeuronAtlas
+from neuron_data import cached_index_path, load_or_build_index, load_published, metadata_version, open_metadata
+from neuron_page import PAGES_FILENAME, PageTable, image_urls
+from neuron_shards import DEFAULT_MAX_SHARDS
+from neuron_suggestions import DEFAULT_NEURON, SUGGESTION_CATEGORIES
+
+DEFAULT_PORT = 8502
+DEFAULT_TOP = 50
+DEFAULT_IMAGES = 20
+LUCID_WIDTH = 300
+STEPS = ("metadata", "indexes", "pages", "images")
+# Run after the steps above; readiness does not wait for them
+BACKGROUND_STEPS = ("atlas",)
+
+INDEXES = (
+    (SIMILARITY_FILENAME, SimilarityIndex),
+    (CLASS_INDEX_FILENAME, ClassHistogramIndex),
+    (CLASS_SEARCH_FILENAME, ClassSearchIndex),
+    (GLOBAL_STATS_FILENAME, GlobalStats),
+)
+
+
+def warm_neurons(metadata, global_stats, top=DEFAULT_TOP):
+    """The default neuron, the notable ones and the `top` most active, without repeats or unknown ids"""
+    candidates = [DEFAULT_NEURON]
+    for neurons in SUGGESTION_CATEGORIES.values():
+        candidates += list(neurons.values())
+    candidates += [nid for nid, _ in global_stats["max_activation"].top(top)] if top > 0 else []
+    return [nid for nid in dict.fromkeys(candidates) if str(nid) in metadata]
+
+
+class Warmup:
+    """Warms the app's shared caches on a daemon thread; `status()` reports how far it got"""
+
+    def __init__(self, base_url, cache_dir, store_dir=None, top=DEFAULT_TOP, images=DEFAULT_IMAGES,
+                 metadata_ttl=3600, image_cache_bytes=1024 << 20, max_shards=DEFAULT_MAX_SHARDS):
+        self.base_url = base_url
+        self.cache_dir = Path(cache_dir)
+        self.store_dir = store_dir
+        self.top = top
+        self.images = images
+        self.image_cache_bytes = image_cache_bytes
+        self.max_shards = max_shards
+        self.fetch = MetadataCache(self.cache_dir / "http", ttl=metadata_ttl).fetch
+        self.error = None
+        self.started = self.finished = None
+        self._lock = threading.Lock()
+        # step -> [state, done, total]; state is pending, running, done or failed
+        self._steps = {step: ["pending", 0, 1] for step in STEPS + BACKGROUND_STEPS}
+        self._ready = threading.Event()
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def wait(self, timeout=None):
+        """Block until ready or timeout; True if ready"""
+        return self._ready.wait(timeout)
+
+    def start(self):
+        threading.Thread(target=self.run, name="warmup", daemon=True).start()
+        return self
+
+    def status(self):
+        """JSON-able progress report: ready, overall progress in [0, 1], each step's state, error"""
+        with self._lock:
+            steps = {step: {"state": state, "done": done, "total": total}
+                     for step, (state, done, total) in self._steps.items()}
+        progress = sum(min(steps[step]["done"] / max(steps[step]["total"], 1), 1.0) for step in STEPS) / len(STEPS)
+        end = self.finished or time.time()
+        return {
+            "ready": self.ready,
+            "progress": round(progress, 3),
+            "elapsed_s": round(end - self.started, 1) if self.started else 0.0,
+            "steps": steps,
+            "error": self.error,
+        }
+
+    def _update(self, step, state=None, total=None):
+        with self._lock:
+            entry = self._steps[step]
+            if state is not None:
+                entry[0] = state
+            if total is not None:
+                entry[2] = total
+
+    def _advance(self, step):
+        with self._lock:
+            self._steps[step][1] += 1
+
+    def _run_step(self, step, fn, *args):
+        self._update(step, state="running")
+        try:
+            result = fn(*args)
+        except Exception:
+            self._update(step, state="failed")
+            raise
+        with self._lock:
+            self._steps[step][0] = "done"
+            self._steps[step][1] = self._steps[step][2]
+        return result
+
+    def run(self):
+        """All steps in order; a failed step ends the warm-up without becoming ready"""
+        self.started = time.time()
+        try:
+            metadata = self._run_step("metadata", self._load_metadata)
+            indexes = self._run_step("indexes", self._build_indexes, metadata)
+            neurons = warm_neurons(metadata, indexes[GLOBAL_STATS_FILENAME], self.top)
+            self._run_step("pages", self._build_pages, metadata, indexes, neurons)
+            self._run_step("images", self._fetch_images, metadata, neurons)
+            self._ready.set()
+            self._run_step("atlas", self._build_atlas, metadata)
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+        finally:
+            self.finished = time.time()
+
+    def _load_metadata(self):
+        return open_metadata(self.base_url, self.fetch, self.cache_dir, store_dir=self.store_dir,
+                             max_shards=self.max_shards)
+
+    def _build_indexes(self, metadata):
+        """{filename: index}, loaded from the cache or built into it, as the app would"""
+        self._update("indexes", total=len(INDEXES) + 1)
+        version = metadata_version(metadata)
+        indexes = {}
+        for filename, index_cls in INDEXES:
+            indexes[filename] = load_or_build_index(metadata, version, filename, index_cls, self.cache_dir)
+            self._advance("indexes")
+        indexes[SKETCHES_FILENAME] = load_published(metadata, SKETCHES_FILENAME, ActivationSketches,
+                                                    self.base_url, self.fetch)
+        return indexes
+
+    def _build_pages(self, metadata, indexes, neurons):
+        version = metadata_version(metadata)
+        # A published table is now in the HTTP cache; only without one (or a version to key ours by) build
+        if version is None or load_published(metadata, PAGES_FILENAME, PageTable, self.base_url, self.fetch):
+            return
+        table = PageTable.build(
+            metadata, neuron_ids=neurons,
+            similarity_index=indexes[SIMILARITY_FILENAME], class_index=indexes[CLASS_INDEX_FILENAME],
+            range_index=ActivationRangeIndex.build(metadata), sketches=indexes[SKETCHES_FILENAME],
+        )
+        table.save(cached_index_path(self.cache_dir, version, PAGES_FILENAME))
+
+    def _fetch_images(self, metadata, neurons):
+        """Lucid image and top-image thumbnails of each neuron in the default split, as the first views show them"""
+        self._update("images", total=len(neurons))
+        image_cache = ImageCache(self.cache_dir / "images", max_bytes=self.image_cache_bytes)
+        lucid_cache = LucidCache(image_cache, lambda nid: f"{self.base_url}/{lucid_image_path(nid)}",
+                                 self.cache_dir / "lucid", listing=lucid_listing(metadata))
+        splits = metadata_splits(metadata)
+        split = splits[0] if splits else "train"
+        for neuron_idx in neurons:
+            lucid_cache.get(neuron_idx, width=LUCID_WIDTH)
+            images = metadata[str(neuron_idx)].get("top_images", {}).get(split, [])[:self.images]
+            image_cache.get_thumbnails(list(image_urls(self.base_url, neuron_idx, [img["filename"] for img in images])))
+            self._advance("images")
+
+    def _build_atlas(self, metadata):
+        load_or_build_index(metadata, metadata_version(metadata), ATLAS_FILENAME, NeuronAtlas, self.cache_dir)
+
+
+def serve_readiness(warmup, port, host="0.0.0.0"):
+    """Serve warmup.status() at http://host:port/ready from a daemon thread: 200 when ready, else 503"""
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/ready":
+                self.send_error(404)
+                return
+            status = warmup.status()
+            body = json.dumps(status).encode("utf-8")
+            self.send_response(200 if status["ready"] else 503)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", "no-store")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="readiness-server", daemon=True).start()
+    return server
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python warmup.py", description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="serves GET /ready")
+    parser.add_argument("--once", action="store_true", help="warm up and exit instead of serving /ready")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP, help="also warm the N most active neurons")
+    parser.add_argument("--images", type=int, default=DEFAULT_IMAGES, help="thumbnails per neuron")
+    parser.add_argument("--data", default=os.environ.get("CLIP_MICROSCOPE_DATA", HF_BASE_URL),
+                        help="dataset URL or local mirror (default: $CLIP_MICROSCOPE_DATA or Hugging Face)")
+    parser.add_argument("--store", default=os.environ.get("CLIP_MICROSCOPE_STORE"),
+                        help="prebuilt metadata store (default: $CLIP_MICROSCOPE_STORE)")
+    parser.add_argument("--cache-dir", type=Path, default=Path(os.environ.get(
+        "CLIP_MICROSCOPE_CACHE_DIR", Path.home() / ".cache" / "clip-microscope")))
+    args = parser.parse_args(argv[1:])
+
+    warmup = Warmup(
+        as_base_url(args.data), args.cache_dir, store_dir=args.store, top=args.top, images=args.images,
+        metadata_ttl=int(os.environ.get("CLIP_MICROSCOPE_METADATA_TTL", 3600)),
+        image_cache_bytes=int(os.environ.get("CLIP_MICROSCOPE_IMAGE_CACHE_MB", 1024)) << 20,
+        max_shards=int(os.environ.get("CLIP_MICROSCOPE_SHARD_CACHE", DEFAULT_MAX_SHARDS)),
+    )
+    if args.once:
+        warmup.run()
+        status = warmup.status()
+        print(json.dumps(status, indent=2))
+        return 0 if status["ready"] else 1
+
+    serve_readiness(warmup, args.port, args.host)
+    print(f"Warming up; readiness on http://{args.host}:{args.port}/ready")
+    warmup.start()
+    try:
+        # Report once ready, or once the warm-up stops without getting there
+        while not (warmup.wait(5) or warmup.finished):
+            pass
+        print(f"Ready after {warmup.status()['elapsed_s']}s" if warmup.ready else f"Warm-up failed: {warmup.error}")
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))